@@ -1,69 +1,127 @@
 from wordcloud import WordCloud
-from collections import Counter
-import emoji
+import io
 import pandas as pd
-import re
-import os
+from cache import ImageCache, image_key
+from chat_index import ChatIndex
+from instrumentation import instrumented
+from stop_words import STOP_WORDS_VERSION
+from tokens import TOKENIZER_VERSION, extract_emojis, ranked, word_frequencies
 
 
-# Get the directory of the current script
-current_dir = os.path.dirname(__file__)
-file_path = os.path.join(current_dir, 'stop_hinglish.txt')
+# Render parameters of the quick preview and of the full word cloud
+PREVIEW_RENDER = {'width': 200, 'height': 100, 'max_words': 50}
+FULL_RENDER = {'width': 800, 'height': 400, 'max_words': 200}
 
-# Open the stop words file
-try:
-    with open(file_path, "r") as f:
-        stop_words = f.read().splitlines()
-except FileNotFoundError:
-    print(f"Error: The file '{file_path}' was not found.")
-    stop_words = []  # Fallback if the file is not found
+# Rendered word clouds, shared by every session of the app
+IMAGE_CACHE = ImageCache()
 
 
-def generate_wc(df,selected_user):
+@instrumented
+def word_counts(df, selected_user):
+    """
+    Counts the words of a sender's messages, without stop words.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): Processed DataFrame or its index
+    - selected_user (str): Sender name, or 'Whole Group' for every message
+
+    Returns:
+    - pd.Series: Word counts indexed by word, most frequent first
+    """
+
+    #precomputed frequencies of the sender
+    if isinstance(df, ChatIndex):
+        return df.counts('words', selected_user)
 
     #specific user
     if selected_user!="Whole Group":
         df = df[df['Sender'] == selected_user]
-    
-    #removing stopwords from message column
-    words = df['Message'].apply(lambda x: ' '.join([word.lower() for word in x.split() if word not in stop_words])) 
 
-    #removing "." "," "?" in words
-    punctuations=[',','.','?']
-    for p in punctuations:
-        words = words.apply(lambda x: x.replace(p,''))
+    return word_frequencies(df['Message'])
 
-    #wc instance
-    wc= WordCloud(background_color='#020400',min_font_size=10)
-    wc_file=wc.generate(words.str.cat(sep=' '))                 #convert to string then concatinate with seperator as " "
 
-    ##finding frequencies of each word occured
-    all_words = []
-    for message in words:
-        all_words.extend(message.split())  # Split each message and add its words to the list
+@instrumented
+def draw_wc(frequencies, width, height, max_words):
+    """
+    Lays out a word cloud and encodes it as PNG.
 
-    word_freq = Counter(all_words).most_common(20) # Create the Counter object after collecting all word
+    Parameters:
+    - frequencies (pd.Series): Word counts, most frequent first
+    - width (int): Width of the canvas in pixels
+    - height (int): Height of the canvas in pixels
+    - max_words (int): Number of most frequent words drawn
 
-    return wc_file.to_image(), word_freq
+    Returns:
+    - bytes: The PNG image
+    """
 
+    #wc instance, laid out straight from the frequency table instead of re-tokenizing the text
+    wc= WordCloud(background_color='#020400',min_font_size=10,width=width,height=height,max_words=max_words)
+    wc.generate_from_frequencies(frequencies.head(max_words).to_dict())
 
+    buffer = io.BytesIO()
+    wc.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()
 
-def emoji_analysis(df, selected_user):
-    # Filter for the specific user
-    if selected_user != "Whole Group":
-        df = df[df['Sender'] == selected_user]
 
-    # Extract emojis from messages
-    all_emojis = []
-    df['Message'].apply(lambda x: all_emojis.extend([char for char in x if char in emoji.EMOJI_DATA]))
+@instrumented
+def render_wc(df, selected_user, frequencies, preview=False, images=IMAGE_CACHE):
+    """
+    Renders the word cloud of a sender, reusing a cached PNG when there is one.
+
+    Images are keyed by the chat's content hash, the sender, the stop-word set
+    version and the render parameters, so a hit skips the layout entirely.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): Processed DataFrame or its index, for its chat_key
+    - selected_user (str): Sender name, or 'Whole Group'
+    - frequencies (pd.Series): Word counts of the sender, see word_counts
+    - preview (bool): Render the small, quick preview instead of the full image
+    - images (ImageCache): Cache of the rendered images
+
+    Returns:
+    - bytes: The PNG image, or None if there are no words
+    """
+
+    if frequencies.empty:
+        return None
+
+    params = PREVIEW_RENDER if preview else FULL_RENDER
+    key = image_key(df.attrs.get('chat_key'), selected_user, STOP_WORDS_VERSION, TOKENIZER_VERSION,
+                    tuple(sorted(params.items())))
+    return images.render(key, draw_wc, frequencies=frequencies, **params)
+
+
+@instrumented
+def generate_wc(df,selected_user):
+
+    #word frequencies of the messages, stop words removed
+    frequencies = word_counts(df, selected_user)
+    if frequencies.empty:
+        return None, []
+
+    wc_file = render_wc(df, selected_user, frequencies)
+    word_freq = list(frequencies.head(20).items())
+
+    return wc_file, word_freq
+
+
+
+@instrumented
+def emoji_analysis(df, selected_user):
+    # Precomputed frequencies of the sender
+    if isinstance(df, ChatIndex):
+        emoji_freq = df.counts('emoji', selected_user)
+    else:
+        # Filter for the specific user
+        if selected_user != "Whole Group":
+            df = df[df['Sender'] == selected_user]
 
-    # Calculate emoji frequencies
-    emoji_freq = Counter(all_emojis)
+        # Extract emojis from messages and count them in one pass, ordered like the ChatIndex counts
+        emoji_freq = ranked(pd.Series(extract_emojis(df['Message']), dtype=object).value_counts())
 
-    emojis, frequencies = zip(*emoji_freq.items())  # Use .items() to get (emoji, frequency) pairs
-    emoji_df = pd.DataFrame({'Emoji': emojis, 'Frequency': frequencies})
+    emoji_df = pd.DataFrame({'Emoji': emoji_freq.index.to_numpy(), 'Frequency': emoji_freq.to_numpy()})
 
-    
     return emoji_df
 
 
@@ -1,6 +1,10 @@
-from urlextract import URLExtract
 import matplotlib.pyplot as plt
 import pandas as pd
+from chat_index import ChatIndex
+from links import URL_EXTRACTOR, find_links
+from instrumentation import instrumented
+from preprocessor import column
+from tokens import ranked
 
 def extract_link(message):
 
@@ -14,22 +18,22 @@ def extract_link(message):
     - bool: True if at least one URL is found, None otherwise.
     """
       
-        #no of links
-    extractor= URLExtract()
-    url=extractor.find_urls(message)
+        #no of links, with the extractor shared by every call
+    url=URL_EXTRACTOR.find_urls(message)
     if len(url)>0:
         return True
     else:
         return None
     
 
+@instrumented
 def most_active_user(df):
 
     """
     Identifies the most active users in the chat.
 
     Parameters:
-    - df (pd.DataFrame): DataFrame containing chat data with a 'Sender' column.
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with a 'Sender' column, or its index.
 
     Returns:
     - pd.Series: A series of the top active users and their message counts.
@@ -37,7 +41,10 @@ def most_active_user(df):
     """
 
     #most active user
-    most_active_users=df['Sender'].value_counts()
+    if isinstance(df, ChatIndex):
+        most_active_users=df.totals['messages'].sort_values(ascending=False, kind='stable').rename('count')
+    else:
+        most_active_users=df['Sender'].value_counts()
 
     #df of the most_active_user
     most_active_users_df=most_active_users.to_frame('Message Count')
@@ -48,19 +55,25 @@ def most_active_user(df):
 
 
 
+@instrumented
 def fetch_stats(df,selected_user):
 
     """
     Fetches chat statistics including message count, word count, media files, and links.
 
     Parameters:
-    - df (pd.DataFrame): DataFrame containing chat data with 'Sender' and 'Message' columns.
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender' and 'Message' columns, or its index.
     - selected_user (str): Selected user for which stats are to be fetched. Use 'Whole Group' for group stats.
 
     Returns:
     - tuple: Contains total messages, total words, total media files, and total links.
     """
 
+    #precomputed totals of the sender
+    if isinstance(df, ChatIndex):
+        return (df.total('messages', selected_user), df.total('words', selected_user),
+                df.total('media', selected_user), df.total('links', selected_user))
+
     #for specific user:
     if (selected_user!="Whole Group"):
         df=df[df['Sender']==selected_user]
@@ -76,15 +89,62 @@ def fetch_stats(df,selected_user):
     total_media=len(media_omitted_messages)
 
     #no of links
-    # total_link=0
-    # for i in range(len(df)):
-    #     if extract_link(df['Message'].iloc[i]):
-    #         total_link+=1
+    total_link = len(find_links(df['Message']))
     
-    return total_messages,total_words, total_media #, total_link
+    return total_messages,total_words, total_media, total_link
+
+
+
+@instrumented
+def link_counts(df):
+
+    """
+    Counts the links shared by every sender.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender' and 'Message' columns, or its index.
+
+    Returns:
+    - pd.DataFrame: DataFrame with 'Links' shared per sender, most links first.
+    """
+
+    if isinstance(df, ChatIndex):
+        links = df.totals['links']
+    else:
+        found = find_links(df['Message'])
+        links = df['Sender'].take(found['row']).value_counts()
+
+    return links.sort_values(ascending=False, kind='stable').to_frame('Links')
+
+
 
+@instrumented
+def top_domains(df, selected_user, n=10):
 
+    """
+    Finds the domains whose links are shared most.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender' and 'Message' columns, or its index.
+    - selected_user (str): Selected user whose links are counted. Use 'Whole Group' for group stats.
+    - n (int): Number of domains returned.
+
+    Returns:
+    - pd.DataFrame: DataFrame with 'Domain' and 'Links' columns, most shared first.
+    """
+
+    if isinstance(df, ChatIndex):
+        domains = df.counts('domains', selected_user)
+    else:
+        if selected_user != 'Whole Group':
+            df = df[df['Sender'] == selected_user]
+        domains = ranked(find_links(df['Message'])['Domain'].value_counts())
+
+    return domains.head(n).rename_axis('Domain').reset_index(name='Links')
 
+
+
+@instrumented
 def monthly_timeline(selected_user,df):
 
     """
@@ -92,16 +152,19 @@ def monthly_timeline(selected_user,df):
 
     Parameters:
     - selected_user (str): Selected user for which the timeline is generated. Use 'Whole Group' for group stats.
-    - df (pd.DataFrame): DataFrame containing chat data with 'Sender', 'year', and 'month' columns.
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender', 'year', and 'month' columns, or its index.
 
     Returns:
     - pd.DataFrame: DataFrame with 'year', 'month', and 'time' columns for the timeline.
     """
 
-    if selected_user != 'Whole Group':
-        df = df[df['Sender'] == selected_user]
+    if isinstance(df, ChatIndex):
+        timeline = df.counts('monthly', selected_user).rename('Message').reset_index()
+    else:
+        if selected_user != 'Whole Group':
+            df = df[df['Sender'] == selected_user]
 
-    timeline = df.groupby(['year', 'month']).count()['Message'].reset_index()
+        timeline = df.groupby(['year', 'month'], observed=True).count()['Message'].reset_index()
 
     time = []
     for i in range(timeline.shape[0]):
@@ -111,25 +174,30 @@ def monthly_timeline(selected_user,df):
 
     return timeline
 
+@instrumented
 def daily_timeline(selected_user,df):
     """
     Generates a daily timeline of message counts.
 
     Parameters:
     - selected_user (str): Selected user for which the timeline is generated. Use 'Whole Group' for group stats.
-    - df (pd.DataFrame): DataFrame containing chat data with 'Sender' and 'Date' columns.
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender' and 'Date' columns, or its index.
 
     Returns:
     - pd.DataFrame: DataFrame with daily message counts.
     """
 
+    if isinstance(df, ChatIndex):
+        return df.counts('daily', selected_user).rename('Message').reset_index()
+
     if selected_user != 'Whole Group':
         df = df[df['Sender'] == selected_user]
 
-    daily_timeline = df.groupby('Date').count()['Message'].reset_index()
+    daily_timeline = df.groupby(column(df, 'Date')).count()['Message'].reset_index()
 
     return daily_timeline
 
+@instrumented
 def week_activity_map(selected_user,df):
 
     """
@@ -137,25 +205,35 @@ def week_activity_map(selected_user,df):
 
     Parameters:
     - selected_user (str): Selected user for which the activity map is generated. Use 'Whole Group' for group stats.
-    - df (pd.DataFrame): DataFrame containing chat data with 'Sender' and 'day_name' columns.
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender' and 'day_name' columns, or its index.
 
     Returns:
     - pd.Series: Series with day-of-week activity counts.
     """
 
+    if isinstance(df, ChatIndex):
+        return df.counts('weekday', selected_user).sort_values(ascending=False, kind='stable').rename('count')
 
     if selected_user != 'Whole Group':
         df = df[df['Sender'] == selected_user]
 
-    return df['day_name'].value_counts()
+    # Categorical days (compact schema) also count the days without messages; drop them
+    day_counts = df['day_name'].value_counts()
+    return day_counts[day_counts > 0]
 
+@instrumented
 def month_activity_map(selected_user,df):
 
+    if isinstance(df, ChatIndex):
+        return df.counts('month', selected_user).sort_values(ascending=False, kind='stable').rename('count')
+
     if selected_user != 'Whole Group':
         df = df[df['Sender'] == selected_user]
 
-    return df['month'].value_counts()
+    month_counts = df['month'].value_counts()
+    return month_counts[month_counts > 0]
 
+@instrumented
 def activity_heatmap(selected_user,df):
 
     """
@@ -163,16 +241,19 @@ def activity_heatmap(selected_user,df):
 
     Parameters:
     - selected_user (str): Selected user for which the heatmap is generated. Use 'Whole Group' for group stats.
-    - df (pd.DataFrame): DataFrame containing chat data with 'Sender', 'day_name', and 'hour_with_ampm' columns.
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'Sender', 'day_name', and 'hour_with_ampm' columns, or its index.
 
     Returns:
     - pd.DataFrame: A pivot table with days as rows, hours as columns, and message counts as values.
     """
 
+    if isinstance(df, ChatIndex):
+        return df.counts('heatmap', selected_user).unstack().fillna(0)
+
     if selected_user != 'Whole Group':
         df = df[df['Sender'] == selected_user]
 
-    user_heatmap = df.pivot_table(index='day_name', columns='hour_with_ampm', values='Message', aggfunc='count').fillna(0)
+    user_heatmap = df.pivot_table(index='day_name', columns='hour_with_ampm', values='Message', aggfunc='count', observed=True).fillna(0)
 
     return user_heatmap
 
@@ -1,160 +1,508 @@
+import datetime
+import json
+import os
+import time
+from contextvars import copy_context
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import streamlit as st
 import pandas as pd
-from preprocessor import preprocess
+from cache import ResultCache, cached_index, cached_preprocess, cached_search_index
+from search import parse_query, unindexed_words
+from conversations import conversation_analysis
 from analyser import activity_heatmap, daily_timeline, fetch_stats, most_active_user, week_activity_map
 import plotly.express as px
 import numpy as np
-from WordCloudGenerator import generate_wc, emoji_analysis
+from instrumentation import LOGGER, Metrics, cache_event, collect, thread_profile
+from preprocessor import ChatFilter
+from timelines import adapt, daily_points, monthly_points, payload_bytes
+from WordCloudGenerator import IMAGE_CACHE, emoji_analysis, render_wc, word_counts
 import analyser
 
-# Title of project
-st.title('WHATSAPP WRAP')
 
-st.sidebar.title("Sidebar")
+# Threads computing the sections of the dashboard
+SECTION_WORKERS = min(8, (os.cpu_count() or 1) + 2)
 
-#selecting the device from which the chat has been downloaded
-device = st.sidebar.selectbox("Select Device from where the chat is being downloaded", ["Android", "iOS"])
+# Default length of the date range of the filter, ending today
+FILTER_DAYS = 365
 
-uploaded_file = st.sidebar.file_uploader("Choose a file")
-if uploaded_file is not None:
+# Number of matching messages listed by the search, newest first
+SEARCH_RESULTS = 200
 
-    # To read file as bytes:
-    bytes_data = uploaded_file.getvalue()
 
-    # Convert stream to string
-    string_data = bytes_data.decode("utf-8").split("\n")
+def filter_sidebar():
+    """
+    Shows the parse filter in the sidebar and returns the filter chosen.
 
-    # Preprocessing the string_data
-    preprocessed_data = preprocess(string_data,device=device.lower())
+    Returns:
+    - ChatFilter: Messages to keep, or None to analyse the whole chat
+    """
 
+    st.sidebar.subheader("Filter")
+    start = end = senders = None
+    if st.sidebar.checkbox("Only a date range"):
+        today = datetime.date.today()
+        dates = st.sidebar.date_input("Dates", (today - datetime.timedelta(days=FILTER_DAYS), today))
+        if len(dates) == 2:
+            # The last day is included
+            start, end = pd.Timestamp(dates[0]), pd.Timestamp(dates[1]) + pd.Timedelta(days=1)
+    names = st.sidebar.text_input("Only these senders (comma-separated)")
+    if names.strip():
+        senders = tuple(sorted({name.strip() for name in names.split(",") if name.strip()}))
+    exclude_media = st.sidebar.checkbox("Exclude media messages")
+    exclude_system = st.sidebar.checkbox("Exclude system messages")
 
-    # Fetching the sender list
-    sender_list = preprocessed_data['Sender'].unique().tolist()
-    sender_list.insert(0, "Whole Group")
+    chat_filter = ChatFilter(start, end, senders, exclude_media, exclude_system)
+    return None if chat_filter == ChatFilter() else chat_filter
+
+
+def timed(compute, results, chat_index, selected_user):
+    """
+    Runs a section's analysis in a worker thread and measures it.
+
+    It is submitted in a copy of the script's context, so its instrumented calls
+    are recorded in the metrics of the run, and profiled with them if requested.
+
+    Parameters:
+    - compute (callable): Analysis of the section, called with (results, chat_index, selected_user)
+    - results (ResultCache): Memoized results of the session
+    - chat_index (ChatIndex): Index of the chat
+    - selected_user (str): Selected user
+
+    Returns:
+    - tuple: The result and the time taken in seconds
+    """
+
+    start = time.perf_counter()
+    with thread_profile():
+        value = compute(results, chat_index, selected_user)
+    return value, time.perf_counter() - start
+
+
+def show_debug_panel(metrics):
+    """
+    Shows the per-stage metrics of the run: time, rows and memory of every stage, cache counters and the profile.
+    """
+
+    summary = metrics.summary()
+    with st.expander("Debug: pipeline metrics", expanded=True):
+        st.caption(f"{summary['seconds']:.2f}s instrumented"
+                   + (f", {summary['traced_peak_mb']:.1f} MB traced peak" if summary['traced_peak_mb'] is not None else ""))
+        if summary['totals']:
+            totals = pd.DataFrame.from_dict(summary['totals'], orient='index').sort_values('seconds', ascending=False)
+            st.dataframe(totals.rename_axis('stage'))
+            st.dataframe(pd.DataFrame(summary['stages']))
+        st.json(summary['counters'])
+        if metrics.profile_error is not None:
+            st.warning(f"The run was not profiled: {metrics.profile_error}")
+        report = metrics.profile_report()
+        if report is not None:
+            st.code(report)
+
+
+########################## Analysis of the selected user and fetching the statistics ##########################
+def compute_stats(results, chat_index, selected_user):
+    return results.call(fetch_stats, df=chat_index, selected_user=selected_user)
+
+
+def show_stats(container, stats, selected_user):
+    total_message, total_word, total_media, total_links = stats
+    col1, col2, col3, col4 = container.columns(4)
+    col1.metric("Total Messages", total_message)
+    col2.metric("Total Words", total_word)
+    col3.metric("Total Media Files", total_media)
+    col4.metric("Total Links Shared",total_links)
+
+
+######################### FINDING THE MOST ACTIVE USER IN THE GROUP ###################
+def compute_most_active(results, chat_index, selected_user):
+    # Finding the most active user in the group
+    return results.call(most_active_user, df=chat_index)
+
+
+def show_most_active(container, most_active, selected_user):
+    most_active_users, most_active_users_df = most_active
+    container.header("Most Active Users")
+    col1,col2=container.columns(2)
+
+    # Bar graph of the most active users using Plotly
+    fig = px.bar(most_active_users_df, y=most_active_users_df.index, x='Message Count', orientation='h',labels={'x': 'Senders', 'y': 'Messages'}, title='Most Active Users')
     
-    # Displaying the sender list
-    selected_user = st.sidebar.selectbox("Get the WhatsApp Wrap with respect to", sender_list)
+    col1.plotly_chart(fig)
+    col2.dataframe(most_active_users_df)
 
-    # Show analysis button
-    if st.sidebar.button("Show Analysis"):
-        ########################## Analysis of the selected user and fetching the statistics ##########################
-        total_message, total_word, total_media = fetch_stats(df=preprocessed_data, selected_user=selected_user)
-        
-        col1, col2, col3 = st.columns(3)
-        col1.metric("Total Messages", total_message)
-        col2.metric("Total Words", total_word)
-        col3.metric("Total Media Files", total_media)
-        #col4.metric("Total Links Shared",total_links)
-
-        ######################### FINDING THE MOST ACTIVE USER IN THE GROUP ###################
-        if selected_user == "Whole Group":
-            # Finding the most active user in the group
-            most_active_users, most_active_users_df = most_active_user(df=preprocessed_data)
-            st.header("Most Active Users")
-            col1,col2=st.columns(2)
-
-            # Bar graph of the most active users using Plotly
-            fig = px.bar(most_active_users_df, y=most_active_users_df.index, x='Message Count', orientation='h',labels={'x': 'Senders', 'y': 'Messages'}, title='Most Active Users')
-            
-            col1.plotly_chart(fig)
-            col2.dataframe(most_active_users_df)
-
-        ################################# WORDCLOUD ###################################
-        # Wordcloud of the selected user
-        wc_file, word_freq = generate_wc(df=preprocessed_data, selected_user=selected_user)
-        
-        # Displaying the wordcloud on the app
-        
-        st.header(f"Wordcloud of {selected_user}")
-        #increase the size of image
-        st.image(wc_file, width=340)
 
-        # Display top 20 common words using Plotly
-        words, frequencies = zip(*word_freq)  # Unpack tuples into two lists
-        common_words_df = pd.DataFrame({'Words': words, 'Frequency': frequencies})
-        
-        st.header(f"Top 20 Common Words of {selected_user}")
-        fig = px.bar(common_words_df.head(20), y='Words', x='Frequency', orientation='h',title='Top 20 Common Words', labels={'Words': 'Words', 'Frequency': 'Frequency'})
-        st.plotly_chart(fig)
+############################## MOST SHARED DOMAINS ################################
+def compute_domains(results, chat_index, selected_user):
+    domains_df = results.call(analyser.top_domains, df=chat_index, selected_user=selected_user)
+    # Links shared by every sender
+    links_df = results.call(analyser.link_counts, df=chat_index) if selected_user == "Whole Group" else domains_df
+    return domains_df, links_df
 
-        ############################ Emoji Data Analysis #################################
-        emoji_data = emoji_analysis(df=preprocessed_data, selected_user=selected_user)
-        st.title("Emojis Shared")
-        
-        if not emoji_data.empty:  # Check if emoji_data is not empty
-            col1, col2 = st.columns(2)
-
-            emoji_df = pd.DataFrame(emoji_data)
-            col1.dataframe(emoji_df)
-
-            # Pie chart of top 8 emojis using Plotly
-            n = 8
-            top_n_emoji = emoji_df.nlargest(n=n, columns=['Frequency'])
-            fig = px.pie(top_n_emoji, values='Frequency', names='Emoji', title='Top Emojis Shared')
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            col2.plotly_chart(fig)
-        else:
-            st.header("No emojis found")
 
-        ############################## Timeline Analysis #####################
-        # Monthly timeline analysis of the selected user
-        timeline_data = analyser.monthly_timeline(df=preprocessed_data, selected_user=selected_user)
+def show_domains(container, domains, selected_user):
+    domains_df, links_df = domains
+    if not domains_df.empty:
+        container.header(f"Most Shared Domains of {selected_user}")
+        col1, col2 = container.columns(2)
+        fig = px.bar(domains_df, y='Domain', x='Links', orientation='h', title='Most Shared Domains')
+        col1.plotly_chart(fig)
+        col2.dataframe(links_df)
 
-        if not timeline_data.empty:
-            st.header("Monthly Activity")
-            fig = px.line(timeline_data, x="time", y="Message")
-            st.plotly_chart(fig)
-        else:
-            st.header("No data available")
 
-        # Weekly timeline analysis of the selected user
-        daily_activity = analyser.daily_timeline(df=preprocessed_data, selected_user=selected_user)
-        
-        if not daily_activity.empty:
-            st.header("Daily Activity")
-            fig = px.line(daily_activity, x="Date", y="Message")
-            st.plotly_chart(fig)
-        else:
-            st.header("No data available")
+################################# WORDCLOUD ###################################
+def compute_wordcloud(results, chat_index, selected_user):
+    # Wordcloud of the selected user, as a quick low-resolution preview
+    word_freq_all = results.call(word_counts, df=chat_index, selected_user=selected_user)
+    if word_freq_all.empty:
+        return word_freq_all, None
+    return word_freq_all, render_wc(chat_index, selected_user, word_freq_all, preview=True)
 
-        ############ Daywise and Monthwise Activity ####
-        col1, col2 = st.columns(2)
 
-        # Daywise activity of selected user
-        daywise_activity = analyser.week_activity_map(df=preprocessed_data, selected_user=selected_user)
-        
-        if not daywise_activity.empty:
-            col1.header("Day-wise Activity")
-            fig = px.bar(x=daywise_activity.index, y=daywise_activity.values, labels={'x': 'Days', 'y': 'Messages'})
-            col1.plotly_chart(fig)
-        else:
-            st.header("No data available")
+def render_full_wc(results, chat_index, selected_user):
+    word_freq_all = results.call(word_counts, df=chat_index, selected_user=selected_user)
+    return word_freq_all, render_wc(chat_index, selected_user, word_freq_all)
+
 
+def show_wordcloud(container, wordcloud, selected_user):
+    word_freq_all, wc_file = wordcloud
+
+    # Displaying the wordcloud on the app
+    container.header(f"Wordcloud of {selected_user}")
+    if wc_file is None:
+        container.write("No words found")
+        return
+
+    # Placeholder of the preview, replaced by the full render once it is ready
+    wc_placeholder = container.empty()
+    #increase the size of image
+    wc_placeholder.image(wc_file, width=340)
+
+    # Display top 20 common words using Plotly
+    word_freq = list(word_freq_all.head(20).items())
+    words, frequencies = zip(*word_freq)  # Unpack tuples into two lists
+    common_words_df = pd.DataFrame({'Words': words, 'Frequency': frequencies})
+    
+    container.header(f"Top 20 Common Words of {selected_user}")
+    fig = px.bar(common_words_df.head(20), y='Words', x='Frequency', orientation='h',title='Top 20 Common Words', labels={'Words': 'Words', 'Frequency': 'Frequency'})
+    container.plotly_chart(fig)
+    return wc_placeholder
+
+
+def show_full_wordcloud(container, wordcloud, selected_user):
+    container.image(wordcloud[1], width=340)
+
+
+############################ Emoji Data Analysis #################################
+def compute_emoji(results, chat_index, selected_user):
+    return results.call(emoji_analysis, df=chat_index, selected_user=selected_user)
+
+
+def show_emoji(container, emoji_data, selected_user):
+    container.title("Emojis Shared")
+    
+    if not emoji_data.empty:  # Check if emoji_data is not empty
+        col1, col2 = container.columns(2)
+
+        emoji_df = pd.DataFrame(emoji_data)
+        col1.dataframe(emoji_df)
+
+        # Pie chart of top 8 emojis using Plotly
+        n = 8
+        top_n_emoji = emoji_df.nlargest(n=n, columns=['Frequency'])
+        fig = px.pie(top_n_emoji, values='Frequency', names='Emoji', title='Top Emojis Shared')
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        col2.plotly_chart(fig)
+    else:
+        container.header("No emojis found")
+
+
+############################## Timeline Analysis #####################
+def show_timeline(container, timeline, unit, label='Messages'):
+    # Line chart of a timeline, noting when it was reduced to fit the point budget
+    fig = px.line(x=timeline.x, y=timeline.y, labels={'x': 'Date', 'y': label})
+    container.plotly_chart(fig)
+    if len(timeline.x) < timeline.points or timeline.resolution != unit:
+        container.caption(f"{timeline.points:,} {unit}s shown as {len(timeline.x):,} points, "
+                          f"one per {timeline.resolution} ({payload_bytes(fig) / 1024:.0f} KB chart)")
+
+
+def compute_monthly(results, chat_index, selected_user):
+    # Monthly timeline analysis of the selected user, within the point budget of the chart
+    return results.call(monthly_points, df=chat_index, selected_user=selected_user)
+
+
+def show_monthly(container, timeline, selected_user):
+    if len(timeline.x):
+        container.header("Monthly Activity")
+        show_timeline(container, timeline, 'month')
+    else:
+        container.header("No data available")
+
+
+def compute_daily(results, chat_index, selected_user):
+    # Daily timeline analysis of the selected user, rolled up to weeks or months on long chats
+    return results.call(daily_points, df=chat_index, selected_user=selected_user)
+
+
+def show_daily(container, timeline, selected_user):
+    if len(timeline.x):
+        container.header("Daily Activity")
+        show_timeline(container, timeline, 'day')
+    else:
+        container.header("No data available")
+
+
+############ Daywise and Monthwise Activity ####
+def compute_weekday(results, chat_index, selected_user):
+    # Daywise activity of selected user
+    return results.call(analyser.week_activity_map, df=chat_index, selected_user=selected_user)
+
+
+def show_weekday(container, daywise_activity, selected_user):
+    if not daywise_activity.empty:
+        container.header("Day-wise Activity")
+        fig = px.bar(x=daywise_activity.index, y=daywise_activity.values, labels={'x': 'Days', 'y': 'Messages'})
+        container.plotly_chart(fig)
+    else:
+        container.header("No data available")
+
+
+def compute_month(results, chat_index, selected_user):
+    # Monthwise activity
+    return results.call(analyser.month_activity_map, df=chat_index, selected_user=selected_user)
+
+
+def show_month(container, monthwise_activity, selected_user):
+    if not monthwise_activity.empty:
+        container.header("Month-wise Activity")
+        fig = px.bar(x=monthwise_activity.index, y=monthwise_activity.values, labels={'x': 'Months', 'y': 'Messages'})
+        container.plotly_chart(fig)
+    else:
+        container.header("No data available")
+
+
+############### Activity Heatmap ############
+def compute_heatmap(results, chat_index, selected_user):
+    return results.call(activity_heatmap, df=chat_index, selected_user=selected_user)
+
+
+def show_heatmap(container, activity_map, selected_user):
+    if not activity_map.empty:
+        container.header("Activity Heatmap")
         
-        # Monthwise activity
-        monthwise_activity = analyser.month_activity_map(df=preprocessed_data, selected_user=selected_user)
+        # Create a heatmap using Plotly Express
+        fig = px.imshow(activity_map.values,
+                        labels=dict(x="Hour of the Day", y="Days"),
+                        x=list(activity_map.columns),
+                        y=list(activity_map.index),
+                        color_continuous_scale='Viridis')
         
-        if not monthwise_activity.empty:
-            col2.header("Month-wise Activity")
-            fig = px.bar(x=monthwise_activity.index, y=monthwise_activity.values, labels={'x': 'Months', 'y': 'Messages'})
-            col2.plotly_chart(fig)
+        container.plotly_chart(fig)
+
+
+############### Conversations and Reply Times ############
+def compute_conversations(results, chat_index, selected_user):
+    # Sessions and replies involve the whole group, so they are computed once for every user
+    return results.call(conversation_analysis, df=chat_index)
+
+
+def show_conversations(container, conversations, selected_user):
+    sessions, daily, senders, matrix = conversations
+    if sessions.empty:
+        return
+    container.header("Conversations")
+    col1, col2, col3 = container.columns(3)
+    col1.metric("Conversations", len(sessions))
+    col2.metric("Per Active Day", round(daily['Sessions'].mean(), 2))
+    col3.metric("Median Length", f"{int(sessions['messages'].median())} messages")
+
+    container.subheader("Conversations per Day")
+    sessions_per_day = adapt(daily['Date'].to_numpy(dtype='datetime64[ns]'), daily['Sessions'].to_numpy(), 'day')
+    show_timeline(container, sessions_per_day, 'day', label='Conversations')
+
+    # Reply times of the selected user, or of everyone
+    if selected_user != "Whole Group":
+        senders = senders.loc[senders.index == selected_user]
+    container.subheader("Reply Times")
+    container.dataframe(senders)
+
+    if selected_user == "Whole Group":
+        container.subheader("Who Replies to Whom")
+        fig = px.imshow(matrix.values,
+                        labels=dict(x="Responder", y="Replied to", color="Replies"),
+                        x=list(matrix.columns),
+                        y=list(matrix.index),
+                        color_continuous_scale='Viridis')
+        container.plotly_chart(fig)
+
+
+############### Full-text Search ############
+def show_search(results, df, query, selected_user):
+    # Inverted index of the chat's words, built once and stored with the parsed chat
+    search_index = results.call(cached_search_index, df=df)
+
+    st.header(f"Search: {query}")
+    words, unindexed = parse_query(query)[0], unindexed_words(query)
+    if words and len(unindexed) == len(words):
+        st.info(f"Common words such as {', '.join(repr(word) for word in unindexed)} are not indexed; "
+                "search for a less common word.")
+        return
+    if unindexed:
+        st.caption(f"Not indexed: {', '.join(unindexed)}; in a phrase they match any word at their place, "
+                   "otherwise they are left out.")
+    start = end = None
+    with st.expander("Search dates"):
+        first, last = df['timestamp'].min().date(), df['timestamp'].max().date()
+        dates = st.date_input("Messages sent between", (first, last), min_value=first, max_value=last)
+        if len(dates) == 2 and tuple(dates) != (first, last):
+            start, end = pd.Timestamp(dates[0]), pd.Timestamp(dates[1]) + pd.Timedelta(days=1)
+
+    started = time.perf_counter()
+    rows = search_index.search(query, selected_user, start, end)
+    occurrences, messages = search_index.count(query, selected_user, start, end)
+    seconds = time.perf_counter() - started
+
+    col1, col2 = st.columns(2)
+    col1.metric("Messages", messages)
+    col2.metric("Occurrences", occurrences)
+    st.caption(f"Answered in {seconds * 1e3:.1f} ms from the index of {len(search_index.words):,} words")
+    if not messages:
+        return
+
+    counts = search_index.counts_over_time(query, 'D', selected_user, start, end)
+    show_timeline(st, adapt(counts.index.to_numpy(), counts.to_numpy(), 'day'), 'day', label='Occurrences')
+    st.dataframe(search_index.messages(rows[::-1], limit=SEARCH_RESULTS))
+
+
+# Sections of the dashboard: name -> (analysis run in a worker thread, renderer run in the script thread)
+SECTIONS = {
+    'stats': (compute_stats, show_stats),
+    'most_active': (compute_most_active, show_most_active),
+    'domains': (compute_domains, show_domains),
+    'wordcloud': (compute_wordcloud, show_wordcloud),
+    'wordcloud_full': (render_full_wc, show_full_wordcloud),
+    'emoji': (compute_emoji, show_emoji),
+    'monthly': (compute_monthly, show_monthly),
+    'daily': (compute_daily, show_daily),
+    'weekday': (compute_weekday, show_weekday),
+    'month': (compute_month, show_month),
+    'heatmap': (compute_heatmap, show_heatmap),
+    'conversations': (compute_conversations, show_conversations),
+}
+
+# Order of the sections on the page; 'activity_maps' holds the weekday and month charts side by side
+SECTION_ORDER = ['stats', 'most_active', 'domains', 'wordcloud', 'emoji', 'monthly', 'daily', 'activity_maps', 'heatmap', 'conversations']
+
+# Title of project
+st.title('WHATSAPP WRAP')
+
+st.sidebar.title("Sidebar")
+
+uploaded_file = st.sidebar.file_uploader("Choose a file",
+                                         help="The exported chat: the .txt file, or the .zip WhatsApp shares")
+if uploaded_file is not None:
+
+    # Preprocessing the upload, streamed block by block instead of decoding it all at once.
+    # A .zip export is read from its chat text, decompressed as it is parsed, and the
+    # encoding (UTF-8 or UTF-16, with or without a byte order mark) is detected.
+    # The device and date/time format of the export are detected automatically, and the
+    # parsed chat is cached on disk so reruns of the script do not parse it again.
+    # The compact schema (categoricals, small integers, Arrow strings) keeps large chats in memory.
+    # The filter is applied during the parse, so a recent window of a long chat is quick to analyse.
+    chat_filter = filter_sidebar()
+
+    # Optional per-stage metrics of this run, with a cProfile profile and traced memory on request
+    debug = st.sidebar.checkbox("Debug panel")
+    metrics = Metrics(profile=debug and st.sidebar.checkbox("Profile this run (cProfile)"),
+                      trace_memory=debug and st.sidebar.checkbox("Trace memory (tracemalloc)"))
+
+    # The parsed chat of the current upload and filter is kept in the session, so reruns (a new
+    # user, a keystroke in the search box) skip hashing the upload and reading the Parquet file.
+    # Only the latest one is kept, so an earlier upload does not stay in memory
+    loaded_key = (getattr(uploaded_file, "file_id", None), chat_filter)
+    loaded = st.session_state.get("loaded_chat")
+    with collect(metrics):
+        if loaded_key[0] is not None and loaded is not None and loaded[0] == loaded_key:
+            preprocessed_data = loaded[1]
+            cache_event("session_chats", True)
         else:
-            st.header("No data available")
+            preprocessed_data = cached_preprocess(uploaded_file, compact=True, chat_filter=chat_filter)
+            cache_event("session_chats", False)
+            if loaded_key[0] is not None:
+                st.session_state["loaded_chat"] = (loaded_key, preprocessed_data)
 
-        ############### Activity Heatmap ############
-        activity_map = activity_heatmap(df=preprocessed_data, selected_user=selected_user)
-        
-        if not activity_map.empty:
-            st.header("Activity Heatmap")
-            
-            # Create a heatmap using Plotly Express
-            fig = px.imshow(activity_map.values,
-                            labels=dict(x="Hour of the Day", y="Days"),
-                            x=list(activity_map.columns),
-                            y=list(activity_map.index),
-                            color_continuous_scale='Viridis')
-            
-            st.plotly_chart(fig)
+    if preprocessed_data is None:
+        st.error("Could not recognise this file as a WhatsApp chat export.")
+        st.stop()
+    if preprocessed_data.empty:
+        st.warning("No messages match the filter.")
+        st.stop()
+
+
+    # Analysis results of this session, memoized per (chat, user, function)
+    if "results" not in st.session_state:
+        st.session_state["results"] = ResultCache()
+    results = st.session_state["results"]
+
+    # Per-sender index of the chat, built once and shared by every analysis. It is stored with the
+    # parsed chat, and a re-export of the same chat only aggregates the messages it adds
+    with collect(metrics):
+        chat_index = results.call(cached_index, df=preprocessed_data)
+
+    # Fetching the sender list
+    sender_list = preprocessed_data['Sender'].unique().tolist()
+    sender_list.insert(0, "Whole Group")
+    
+    # Displaying the sender list
+    selected_user = st.sidebar.selectbox("Get the WhatsApp Wrap with respect to", sender_list)
+
+    # Full-text search of the selected user's messages
+    query = st.sidebar.text_input("Search messages", help='Words, or a "phrase" between double quotes')
+    if query.strip():
+        show_search(results, preprocessed_data, query.strip(), selected_user)
+
+    # Show analysis button
+    if st.sidebar.button("Show Analysis"):
+        # Every section gets its place on the page up front and is filled in as soon as its
+        # analysis is ready, so the cheap metrics and charts are not held up by the word cloud
+        started = time.perf_counter()
+        containers = {name: st.container() for name in SECTION_ORDER}
+        if selected_user != "Whole Group":
+            del containers['most_active']
+        daywise_col, monthwise_col = containers['activity_maps'].columns(2)
+        containers['weekday'], containers['month'] = daywise_col, monthwise_col
+        del containers['activity_maps']
+
+        timings = {}
+        with collect(metrics), ThreadPoolExecutor(max_workers=SECTION_WORKERS) as pool:
+            pending = {pool.submit(copy_context().run, timed, SECTIONS[name][0], results, chat_index, selected_user): name
+                       for name in containers}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    value, seconds = future.result()
+                    shown = SECTIONS[name][1](containers[name], value, selected_user)
+                    timings[name] = (seconds, time.perf_counter() - started)
+
+                    # The full word cloud replaces the preview once the preview is on the page
+                    if name == 'wordcloud' and shown is not None:
+                        containers['wordcloud_full'] = shown
+                        pending[pool.submit(copy_context().run, timed, render_full_wc, results, chat_index,
+                                            selected_user)] = 'wordcloud_full'
+
+        # Section timings go to the metrics log, one JSON object per line like the stage records
+        for name, (seconds, ready) in timings.items():
+            LOGGER.debug(json.dumps({'section': name, 'seconds': seconds, 'shown_after': ready}))
+        first_chart = min(ready for _, ready in timings.values())
+        st.sidebar.caption(f"First section shown after {first_chart:.2f}s, all after {time.perf_counter() - started:.2f}s")
+
+        # Memoization counters of this session
+        stats = results.stats()
+        st.sidebar.caption(f"Cached results: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        wc_stats = IMAGE_CACHE.stats()
+        st.sidebar.caption(f"Word clouds: {wc_stats['hit_rate']:.0%} cache hit rate, "
+                           f"{wc_stats['mean_render_seconds']:.2f}s per render")
     else:
  
 
@@ -165,6 +513,9 @@ if uploaded_file is not None:
         To get started, please choose a user from the dropdown menu present in the sidebar and click the **"Show Analysis"** button
         """)
 
+    if debug:
+        show_debug_panel(metrics)
+
 else:
     
     # Welcome Header
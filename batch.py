@@ -0,0 +1,218 @@
+"""
+Headless batch analysis of many WhatsApp chat exports.
+
+Every export is parsed and analysed in a worker process; the results are
+written as Parquet datasets, one directory per table and one file per chat,
+so they can be read back with pd.read_parquet(<output>/<table>).
+
+Usage:
+    python batch.py EXPORTS... --output results [--workers 8] [--device ios]
+
+EXPORTS are files, directories (searched recursively for *.txt and zipped *.zip
+exports) or glob patterns.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+import analyser
+from chat_index import ChatIndex
+from preprocessor import preprocess
+from WordCloudGenerator import emoji_analysis, word_counts
+
+# Number of most frequent words kept per chat
+TOP_WORDS = 100
+
+# Files searched for in a directory: exports and zipped exports
+EXPORT_PATTERNS = ["*.txt", "*.zip"]
+
+# Tables written for every chat
+TABLES = ['stats', 'monthly', 'daily', 'heatmap', 'emoji', 'words']
+
+
+def find_exports(inputs):
+    """
+    Expands files, directories and glob patterns into a sorted list of export files.
+
+    Parameters:
+    - inputs (list): Paths, directories or glob patterns
+
+    Returns:
+    - list: Paths of the export files, without duplicates
+    """
+
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for name in EXPORT_PATTERNS:
+                paths.update(glob.glob(os.path.join(pattern, "**", name), recursive=True))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def chat_id(path):
+    """
+    Returns a stable identifier of an export, used as its file name in every table.
+    """
+
+    return hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def analyse_chat(path, output, device=None):
+    """
+    Parses and analyses one export and writes its tables. Runs in a worker process.
+
+    Parameters:
+    - path (str): Path of the export
+    - output (str): Output directory
+    - device (str): Device type ('ios' or 'android'), or None to detect it
+
+    Returns:
+    - dict: 'path', 'rows' and per-stage 'timings' in seconds, plus 'error' if the export failed
+    """
+
+    timings = Counter()
+    result = {'path': path, 'rows': 0, 'timings': timings}
+    try:
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            df = preprocess(f, device)
+        if df is None:
+            raise ValueError("could not parse the export")
+        timings['parse'] += time.perf_counter() - start
+        result['rows'] = len(df)
+
+        start = time.perf_counter()
+        chat_index = ChatIndex(df)
+        timings['index'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        heatmap = analyser.activity_heatmap('Whole Group', chat_index)
+        tables = {
+            'stats': chat_index.totals.reset_index(),
+            'monthly': analyser.monthly_timeline('Whole Group', chat_index),
+            'daily': analyser.daily_timeline('Whole Group', chat_index),
+            'heatmap': heatmap.rename_axis(index='day_name', columns='hour').stack().rename('count').reset_index(),
+        }
+        timings['analyse'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        tables['emoji'] = emoji_analysis(chat_index, 'Whole Group')
+        tables['words'] = word_counts(chat_index, 'Whole Group').head(TOP_WORDS).rename_axis('Word').reset_index(name='Frequency')
+        timings['text'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        name = chat_id(path) + ".parquet"
+        for table, frame in tables.items():
+            frame = frame.copy()
+            frame.insert(0, 'chat', path)
+            # Plain strings, so every chat's file has the same schema
+            for column in frame.columns[frame.dtypes.eq('category')]:
+                frame[column] = frame[column].astype(str)
+            os.makedirs(os.path.join(output, table), exist_ok=True)
+            frame.to_parquet(os.path.join(output, table, name), index=False)
+        timings['write'] += time.perf_counter() - start
+
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    return result
+
+
+def failure(path, error):
+    """
+    Returns the result of an export whose worker failed, in the format of analyse_chat.
+    """
+
+    return {'path': path, 'rows': 0, 'timings': Counter(), 'error': f"{type(error).__name__}: {error}",
+            'traceback': "".join(traceback.format_exception(error))}
+
+
+def analyse_exports(paths, output, device=None, workers=None):
+    """
+    Analyses exports in worker processes, yielding their results as they complete.
+
+    A worker that dies (e.g. out of memory on a huge export) breaks the pool and
+    fails every export still queued in it. Those exports are analysed again, one
+    process each, so only the export that crashed its worker is reported as failed.
+
+    Parameters:
+    - paths (list): Paths of the exports
+    - output (str): Output directory
+    - device (str): Device type ('ios' or 'android'), or None to detect it
+    - workers (int): Number of worker processes
+
+    Returns:
+    - generator: One result per export, see analyse_chat
+    """
+
+    broken = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(analyse_chat, path, output, device): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                broken.append((futures[future], e))
+            except Exception as e:
+                yield failure(futures[future], e)
+
+    for path, error in broken:
+        if len(paths) == 1:
+            yield failure(path, error)
+        else:
+            yield from analyse_exports([path], output, device, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("exports", nargs="+", help="Export files, directories or glob patterns")
+    parser.add_argument("--output", required=True, help="Directory of the Parquet tables and the error report")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--device", choices=["ios", "android"], help="Skip format detection")
+    args = parser.parse_args()
+
+    paths = find_exports(args.exports)
+    if not paths:
+        parser.error("no export found")
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    timings = Counter()
+    rows = 0
+    errors = []
+    for done, result in enumerate(analyse_exports(paths, args.output, args.device, args.workers), 1):
+        timings.update(result['timings'])
+        rows += result['rows']
+        if 'error' in result:
+            errors.append(result)
+            print(f"[{done}/{len(paths)}] {result['path']}: {result['error']}")
+    elapsed = time.perf_counter() - start
+
+    # Error report, rewritten on every run so it never describes an older one
+    report = os.path.join(args.output, "errors.csv")
+    pd.DataFrame(errors, columns=['path', 'error', 'traceback']).to_csv(report, index=False)
+
+    analysed = len(paths) - len(errors)
+    print(f"\n{analysed} chats analysed, {len(errors)} failed (see {report})")
+    print(f"{elapsed:.2f}s wall time, {len(paths) / elapsed:.2f} chats/s, {rows / elapsed:,.0f} messages/s "
+          f"with {args.workers} workers")
+    print("\nTime per stage, summed over the workers:")
+    for stage in ['parse', 'index', 'analyse', 'text', 'write']:
+        print(f"  {stage:8} {timings[stage]:9.2f}s  {timings[stage] / max(analysed, 1) * 1e3:9.1f} ms/chat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares the current emoji_analysis against the original per-character one,
+on Latin and on Devanagari messages, whose non-ASCII text holds no emoji.
+
+Usage:
+    python -m benchmarks.bench_emoji [--messages 10000 100000 1000000]
+"""
+
+import argparse
+import time
+import warnings
+
+from benchmarks import baseline
+from benchmarks.synthetic import DEVANAGARI_WORDS, WORDS, generate_lines
+from preprocessor import preprocess
+from WordCloudGenerator import emoji_analysis
+
+
+# Words of the messages of every benchmark case
+SCRIPTS = {"latin": WORDS, "devanagari": DEVANAGARI_WORDS}
+
+
+def timed(func, *args):
+    """
+    Runs func(*args) and returns its result and wall time in seconds.
+    """
+
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    print(f"{'script':>10} {'messages':>10} {'baseline s':>11} {'current s':>10} {'speedup':>8} {'emoji':>8}")
+    for script, vocabulary in SCRIPTS.items():
+        for n_messages in args.messages:
+            df = preprocess("\n".join(generate_lines(n_messages, vocabulary=vocabulary)))
+            expected, baseline_seconds = timed(baseline.emoji_analysis, df, "Whole Group")
+            result, seconds = timed(emoji_analysis, df, "Whole Group")
+            print(f"{script:>10} {n_messages:>10} {baseline_seconds:>11.3f} {seconds:>10.3f} "
+                  f"{baseline_seconds / seconds:>7.1f}x {int(result['Frequency'].sum()):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Times link extraction against the original one-URLExtract-per-message loop.
+
+The original loop is far too slow to run on a whole chat, so it is timed on
+the first --sample messages and its time per message is reported.
+
+Usage:
+    python -m benchmarks.bench_links [--messages 10000 100000 1000000] [--link-rate 0.03]
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import generate_lines
+from links import find_links
+from preprocessor import preprocess
+
+
+def baseline_count(messages):
+    """
+    Counts the messages with a link the way the original fetch_stats did.
+    """
+
+    from urlextract import URLExtract
+
+    total_link = 0
+    for i in range(len(messages)):
+        if len(URLExtract().find_urls(messages.iloc[i])) > 0:
+            total_link += 1
+    return total_link
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--link-rate", type=float, default=0.03)
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'links':>8} {'current s':>10} {'baseline ms/msg':>16} {'baseline s (est.)':>18}")
+    for n_messages in args.messages:
+        messages = preprocess("\n".join(generate_lines(n_messages, link_rate=args.link_rate)))['Message']
+
+        start = time.perf_counter()
+        links = find_links(messages)
+        seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        baseline_count(messages.iloc[:args.sample])
+        per_message = (time.perf_counter() - start) / min(args.sample, len(messages))
+
+        print(f"{n_messages:>10} {len(links):>8} {seconds:>10.3f} {per_message * 1e3:>16.2f} "
+              f"{per_message * n_messages:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Reports the memory of every column of a preprocessed chat in the default and the compact schema.
+
+Usage:
+    python -m benchmarks.bench_memory [--messages 1000000]
+"""
+
+import argparse
+
+from benchmarks.synthetic import generate_lines
+from preprocessor import preprocess
+
+
+def column_memory(df):
+    """
+    Returns the memory of every column of df in MB, counting the Python objects they hold.
+    """
+
+    return df.memory_usage(deep=True, index=False) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--link-rate", type=float, default=0.03)
+    args = parser.parse_args()
+
+    text = "\n".join(generate_lines(args.messages, link_rate=args.link_rate))
+    default = preprocess(text)
+    compact = preprocess(text, compact=True)
+    del text
+
+    before, after = column_memory(default), column_memory(compact)
+    print(f"{'column':16} {'default dtype':>15} {'MB':>9} {'compact dtype':>16} {'MB':>9}")
+    for name in before.index:
+        if name in after.index:
+            print(f"{name:16} {str(default[name].dtype):>15} {before[name]:>9.1f} "
+                  f"{str(compact[name].dtype):>16} {after[name]:>9.1f}")
+        else:
+            print(f"{name:16} {str(default[name].dtype):>15} {before[name]:>9.1f} {'(derived)':>16} {0:>9.1f}")
+    print(f"{'total':16} {'':>15} {before.sum():>9.1f} {'':>16} {after.sum():>9.1f}  "
+          f"({before.sum() / after.sum():.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares the current preprocess against the original list-based one.
+
+Every case runs in a fresh process so that peak RSS is measured in isolation.
+
+Usage:
+    python -m benchmarks.bench_preprocess [--lines 10000 1000000 10000000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import warnings
+
+from benchmarks.synthetic import write_export
+from instrumentation import peak_rss_mb
+
+
+def run_case(impl, path, device):
+    """
+    Parses one export with the given implementation inside a worker process.
+
+    Parameters:
+    - impl (str): 'baseline' or 'current'
+    - path (str): Path of the synthetic export
+    - device (str): Device type ('ios' or 'android')
+
+    Returns:
+    - dict: Rows parsed, wall time in seconds and peak RSS in MB
+    """
+
+    import pandas  # noqa: F401  (imported before the clock starts for both implementations)
+
+    # The baseline's format inference warns once per call, which only clutters the table
+    warnings.simplefilter("ignore")
+
+    start_rss = peak_rss_mb()
+    start = time.perf_counter()
+    if impl == "baseline":
+        from benchmarks.baseline import preprocess
+        with open(path, "rb") as f:
+            # Same as app.py used to do with the upload
+            df = preprocess(f.read().decode("utf-8").split("\n"), device=device)
+    else:
+        from preprocessor import preprocess
+        with open(path, "rb") as f:
+            # The format is detected, as it is in the app
+            df = preprocess(f)
+    elapsed = time.perf_counter() - start
+
+    return {"rows": len(df), "seconds": elapsed, "start_rss_mb": start_rss, "peak_rss_mb": peak_rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--devices", nargs="+", default=["android", "ios"])
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'device':8} {'lines':>10} {'impl':10} {'rows':>10} {'seconds':>9} {'peak MB':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for device in args.devices:
+            for n_lines in args.lines:
+                path = write_export(os.path.join(tmp, f"{device}_{n_lines}.txt"), n_lines, device)
+                baseline_seconds = None
+                for impl in ("baseline", "current"):
+                    with ctx.Pool(1) as pool:
+                        result = pool.apply(run_case, (impl, path, device))
+                    baseline_seconds = baseline_seconds or result["seconds"]
+                    peak = result["peak_rss_mb"]
+                    print(f"{device:8} {n_lines:>10} {impl:10} {result['rows']:>10} "
+                          f"{result['seconds']:>9.2f} {peak if peak is None else round(peak):>9} "
+                          f"{baseline_seconds / result['seconds']:>7.1f}x")
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
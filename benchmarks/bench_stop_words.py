@@ -0,0 +1,79 @@
+"""
+Compares loading and querying the stop-word set against the original list.
+
+Load time is measured in fresh interpreters, so it includes the import of the
+module; lookup cost is the time per token of a membership test.
+
+Usage:
+    python -m benchmarks.bench_stop_words [--runs 20] [--tokens 1000000]
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks import baseline
+from benchmarks.synthetic import WORDS
+from stop_words import HINGLISH_FILE, STOP_WORDS
+
+LOAD_SNIPPETS = {
+    "baseline": ("from benchmarks import baseline; import stop_words as s",
+                 "baseline.load_stop_words(s.HINGLISH_FILE)"),
+    "current": ("import hashlib, os", "import stop_words"),
+}
+
+
+def load_seconds(impl, runs):
+    """
+    Returns the median time to load the stop words in a fresh interpreter.
+
+    Parameters:
+    - impl (str): 'baseline' or 'current'
+    - runs (int): Number of interpreters started
+
+    Returns:
+    - float: Median load time in seconds
+    """
+
+    setup, statement = LOAD_SNIPPETS[impl]
+    code = (f"{setup}\nimport time\nstart = time.perf_counter()\n{statement}\n"
+            f"print(time.perf_counter() - start)")
+    times = sorted(float(subprocess.check_output([sys.executable, "-c", code], text=True))
+                   for _ in range(runs))
+    return times[len(times) // 2]
+
+
+def lookup_seconds(stop_words, tokens):
+    """
+    Returns the time per token of testing tokens against stop_words.
+    """
+
+    start = time.perf_counter()
+    for token in tokens:
+        token in stop_words
+    return (time.perf_counter() - start) / len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # Chat words (rarely stop words, the worst case of a list scan) mixed with stop words
+    rng = random.Random(0)
+    tokens = rng.choices(WORDS + sorted(STOP_WORDS)[:len(WORDS)], k=args.tokens)
+
+    words = {"baseline": baseline.load_stop_words(HINGLISH_FILE), "current": STOP_WORDS}
+    print(f"{'impl':10} {'words':>7} {'load ms':>9} {'lookup ns':>10}")
+    for impl in ("baseline", "current"):
+        # A list scan is too slow for a million tokens; its cost per token does not depend on the count
+        sample = tokens if impl == "current" else tokens[:10_000]
+        print(f"{impl:10} {len(words[impl]):>7} {load_seconds(impl, args.runs) * 1e3:>9.3f} "
+              f"{lookup_seconds(words[impl], sample) * 1e9:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
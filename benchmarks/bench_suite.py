@@ -0,0 +1,238 @@
+"""
+Times every stage of the pipeline on synthetic exports and saves the results as JSON.
+
+Every device and size runs in a fresh process, which generates a seeded export
+and then times parsing, building the ChatIndex, every analyser function,
+generate_wc and emoji_analysis. The analyses are timed on the DataFrame and on
+the ChatIndex the app passes them ('[index]' cases). Each case reports its best
+wall time over --repeat runs, the peak memory it allocates (traced by
+tracemalloc in one more run) and the peak RSS of the process after it.
+
+Runs are compared case by case against an earlier JSON file with --baseline;
+the exit status is 1 if any case got slower by more than --threshold.
+
+Usage:
+    python -m benchmarks.bench_suite [--messages 10000 100000 1000000 10000000] [--devices android ios]
+        [--output results.json] [--baseline previous.json]
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import SENDERS, write_export
+from instrumentation import peak_rss_mb
+
+# Slowdowns smaller than this are timer noise rather than regressions
+MIN_REGRESSION_SECONDS = 0.005
+
+# User the per-sender cases are timed for
+USER = "Whole Group"
+
+# Analyses timed on the DataFrame and on the ChatIndex, in the order of the dashboard
+ANALYSES = {
+    'fetch_stats': lambda analyser, wc, chat: analyser.fetch_stats(chat, USER),
+    'most_active_user': lambda analyser, wc, chat: analyser.most_active_user(chat),
+    'top_domains': lambda analyser, wc, chat: analyser.top_domains(chat, USER),
+    'generate_wc': lambda analyser, wc, chat: wc.generate_wc(chat, USER),
+    'emoji_analysis': lambda analyser, wc, chat: wc.emoji_analysis(chat, USER),
+    'monthly_timeline': lambda analyser, wc, chat: analyser.monthly_timeline(USER, chat),
+    'daily_timeline': lambda analyser, wc, chat: analyser.daily_timeline(USER, chat),
+    'week_activity_map': lambda analyser, wc, chat: analyser.week_activity_map(USER, chat),
+    'month_activity_map': lambda analyser, wc, chat: analyser.month_activity_map(USER, chat),
+    'activity_heatmap': lambda analyser, wc, chat: analyser.activity_heatmap(USER, chat),
+}
+
+
+def measure(func, repeat, trace):
+    """
+    Runs a case repeatedly and measures it.
+
+    Parameters:
+    - func (callable): The case, called without arguments
+    - repeat (int): Number of timed runs
+    - trace (bool): Run it once more under tracemalloc to measure the memory it allocates
+
+    Returns:
+    - tuple: (result of the last run, dict of 'seconds', 'peak_mb' and 'rss_mb')
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+
+    peak = None
+    if trace:
+        del result
+        tracemalloc.start()
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, {'seconds': min(seconds), 'peak_mb': peak, 'rss_mb': peak_rss_mb()}
+
+
+def run_size(device, n_messages, options, compact, repeat, trace, tmp):
+    """
+    Generates one export and times every case on it. Runs in a worker process.
+
+    Parameters:
+    - device (str): Device type ('ios' or 'android')
+    - n_messages (int): Number of messages of the export
+    - options (dict): Options of the generator, see synthetic.generate_lines
+    - compact (bool): Parse into the compact schema, as the app does
+    - repeat (int): Number of timed runs per case
+    - trace (bool): Measure the memory allocated by every case
+    - tmp (str): Directory of the export
+
+    Returns:
+    - list: One dict per case with its 'case', 'seconds', 'peak_mb' and 'rss_mb'
+    """
+
+    import analyser
+    import WordCloudGenerator
+    from chat_index import ChatIndex
+    from preprocessor import preprocess
+
+    path = write_export(os.path.join(tmp, f"{device}_{n_messages}.txt"), n_messages, device, **options)
+
+    def parse():
+        with open(path, "rb") as f:
+            return preprocess(f, compact=compact)
+
+    results = []
+    df, stats = measure(parse, repeat, trace)
+    results.append({'case': 'parse', 'rows': len(df), **stats})
+    os.remove(path)
+
+    chat_index, stats = measure(lambda: ChatIndex(df), repeat, trace)
+    results.append({'case': 'index', 'rows': len(df), **stats})
+
+    for name, analysis in ANALYSES.items():
+        for suffix, chat in (("", df), ("[index]", chat_index)):
+            _, stats = measure(lambda: analysis(analyser, WordCloudGenerator, chat), repeat, trace)
+            results.append({'case': name + suffix, 'rows': len(df), **stats})
+    return results
+
+
+def environment():
+    """
+    Describes the machine and the code a run was made with.
+    """
+
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the time of every case relative to a baseline run.
+
+    Parameters:
+    - results (list): Results of this run
+    - baseline (dict): An earlier run, as saved by --output
+    - threshold (float): Relative slowdown reported as a regression, if also longer than MIN_REGRESSION_SECONDS
+
+    Returns:
+    - list: The results that regressed
+    """
+
+    before = {(r['device'], r['messages'], r['case']): r for r in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('date')}):")
+    print(f"{'device':8} {'messages':>10} {'case':28} {'baseline s':>11} {'seconds':>9} {'ratio':>7}")
+    for result in results:
+        old = before.get((result['device'], result['messages'], result['case']))
+        if old is None:
+            continue
+        ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        regressed = ratio > 1 + threshold and result['seconds'] - old['seconds'] > MIN_REGRESSION_SECONDS
+        if regressed:
+            regressions.append(result)
+        print(f"{result['device']:8} {result['messages']:>10} {result['case']:28} {old['seconds']:>11.4f} "
+              f"{result['seconds']:>9.4f} {ratio:>6.2f}x{'  slower' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--devices", nargs="+", choices=["android", "ios"], default=["android", "ios"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--senders", type=int, default=len(SENDERS), help="Number of participants")
+    parser.add_argument("--words", type=int, nargs=2, default=[1, 12], metavar=("MIN", "MAX"),
+                        help="Number of words per message")
+    parser.add_argument("--emoji-rate", type=float, default=0.2)
+    parser.add_argument("--link-rate", type=float, default=0.03)
+    parser.add_argument("--media-rate", type=float, default=0.05)
+    parser.add_argument("--multiline-rate", type=float, default=0.02)
+    parser.add_argument("--default-schema", action="store_true", help="Parse into the default schema instead of the compact one")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best is reported")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run of every case")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    senders = SENDERS[:args.senders] if args.senders <= len(SENDERS) else [f"Member {i}" for i in range(args.senders)]
+    options = {'seed': args.seed, 'senders': senders, 'words': tuple(args.words), 'emoji_rate': args.emoji_rate,
+               'link_rate': args.link_rate, 'media_rate': args.media_rate, 'multiline_rate': args.multiline_rate}
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    print(f"{'device':8} {'messages':>10} {'case':28} {'seconds':>9} {'peak MB':>9} {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for device in args.devices:
+            for n_messages in args.messages:
+                with ctx.Pool(1) as pool:
+                    cases = pool.apply(run_size, (device, n_messages, options, not args.default_schema,
+                                                  args.repeat, not args.no_memory, tmp))
+                for case in cases:
+                    results.append({'device': device, 'messages': n_messages, **case})
+                    peak = "-" if case['peak_mb'] is None else f"{case['peak_mb']:.1f}"
+                    rss = "-" if case['rss_mb'] is None else f"{case['rss_mb']:.0f}"
+                    print(f"{device:8} {n_messages:>10} {case['case']:28} {case['seconds']:>9.4f} {peak:>9} {rss:>8}")
+
+    run = {'environment': environment(),
+           'options': {**options, 'compact': not args.default_schema, 'repeat': args.repeat},
+           'results': results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} cases slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
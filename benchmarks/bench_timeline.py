@@ -0,0 +1,63 @@
+"""
+Reports the size of the timeline charts sent to the browser before and after downsampling.
+
+Daily message counts of chats spanning several years are reduced to the point
+budget by rolling them up and with LTTB, and the Plotly figure JSON of every
+variant is measured.
+
+Usage:
+    python -m benchmarks.bench_timeline [--years 1 5 10 30] [--budget 500]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from timelines import adapt, payload_bytes
+
+
+def daily_counts(years, seed=0):
+    """
+    Returns synthetic daily message counts with weekly seasonality and occasional spikes.
+
+    Parameters:
+    - years (int): Length of the chat
+    - seed (int): Seed of the random generator
+
+    Returns:
+    - tuple: (datetime64 dates, int64 counts)
+    """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2000-01-01", periods=365 * years, freq="D").to_numpy()
+    counts = rng.poisson(40 + 15 * np.sin(np.arange(len(dates)) * 2 * np.pi / 7))
+    spikes = rng.random(len(dates)) < 0.01
+    counts[spikes] *= 10
+    return dates, counts.astype(np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10, 30])
+    parser.add_argument("--budget", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'years':>5} {'method':8} {'points':>7} {'resolution':>12} {'max':>6} {'KB':>8} {'ms':>7}")
+    for years in args.years:
+        x, y = daily_counts(years)
+        full = payload_bytes(px.line(x=x, y=y))
+        print(f"{years:>5} {'full':8} {len(x):>7} {'day':>12} {y.max():>6} {full / 1024:>8.1f} {'':>7}")
+        for method in ("rollup", "lttb"):
+            start = time.perf_counter()
+            timeline = adapt(x, y, 'day', args.budget, method)
+            seconds = time.perf_counter() - start
+            size = payload_bytes(px.line(x=timeline.x, y=timeline.y))
+            print(f"{years:>5} {method:8} {len(timeline.x):>7} {timeline.resolution:>12} {timeline.y.max():>6} "
+                  f"{size / 1024:>8.1f} {seconds * 1e3:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
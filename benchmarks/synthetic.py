@@ -0,0 +1,112 @@
+"""
+Seeded generator of synthetic WhatsApp chat exports used by the benchmarks.
+"""
+
+import datetime
+import random
+
+SENDERS = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Sana", "Vikram", "Zoya"]
+
+WORDS = ["hello", "kal", "milte", "hai", "office", "party", "movie", "dinner", "yaar", "bhai",
+         "tonight", "weekend", "cricket", "match", "ok", "done", "call", "later", "haan", "nahi"]
+
+# The same kind of chat written in Devanagari, for the non-Latin benchmark cases
+DEVANAGARI_WORDS = ["नमस्ते", "कल", "मिलते", "है", "ऑफिस", "पार्टी", "फिल्म", "खाना", "यार", "भाई",
+                    "आज", "रात", "क्रिकेट", "मैच", "ठीक", "हो", "गया", "बाद", "हाँ", "नहीं"]
+
+EMOJIS = ["😂", "❤️", "👍", "🙏", "🔥", "😍", "🎉", "😭"]
+
+# Shared links; "{id}" is replaced by a random id so most links are distinct
+LINKS = ["https://www.youtube.com/watch?v={id}", "https://www.instagram.com/p/{id}/",
+         "www.amazon.in/dp/{id}", "https://maps.app.goo.gl/{id}", "google.com", "zomato.com/{id}"]
+
+# Placeholder of a media file left out of the export
+MEDIA = {"android": "<Media omitted>", "ios": "\u200eimage omitted"}
+
+# Start on a day > 12 so that the baseline's format inference settles on day-first
+START = datetime.datetime(2016, 1, 13, 9, 0, 0)
+
+
+def format_line(timestamp, sender, message, device):
+    """
+    Formats a single message line the way the given device exports it.
+
+    Parameters:
+    - timestamp (datetime.datetime): Time the message was sent
+    - sender (str): Name of the sender
+    - message (str): Message text
+    - device (str): Device type ('ios' or 'android')
+
+    Returns:
+    - str: The export line, without a trailing newline
+    """
+
+    date = timestamp.strftime("%d/%m/%y")
+    hour = timestamp.hour % 12 or 12
+    ampm = "AM" if timestamp.hour < 12 else "PM"
+    if device == "ios":
+        return f"[{date}, {hour}:{timestamp:%M:%S} {ampm}] {sender}: {message}"
+    return f"{date}, {hour}:{timestamp:%M} {ampm} - {sender}: {message}"
+
+
+def generate_lines(n_lines, device="android", seed=0, link_rate=0.0, senders=SENDERS, words=(1, 12),
+                   emoji_rate=0.2, media_rate=0.0, multiline_rate=0.0, vocabulary=WORDS):
+    """
+    Yields the lines of a synthetic chat export.
+
+    The rates only draw random numbers when they are not zero, so the default
+    options keep producing the same exports as before they were added.
+
+    Parameters:
+    - n_lines (int): Number of messages to produce
+    - device (str): Device type ('ios' or 'android')
+    - seed (int): Seed of the random generator, so exports are reproducible
+    - link_rate (float): Fraction of the messages sharing a link
+    - senders (list): Names of the participants
+    - words (tuple): Minimum and maximum number of words of a message
+    - emoji_rate (float): Fraction of the messages ending with an emoji
+    - media_rate (float): Fraction of the messages that are a media placeholder
+    - multiline_rate (float): Fraction of the messages with a second line
+    - vocabulary (list): Words messages are drawn from, e.g. DEVANAGARI_WORDS
+
+    Returns:
+    - generator: Export lines, without trailing newlines; a multi-line message is
+      yielded as one string holding a newline
+    """
+
+    rng = random.Random(seed)
+    timestamp = START
+    for _ in range(n_lines):
+        timestamp += datetime.timedelta(seconds=rng.randint(1, 600))
+        if media_rate and rng.random() < media_rate:
+            yield format_line(timestamp, rng.choice(senders), MEDIA[device], device)
+            continue
+        message = " ".join(rng.choices(vocabulary, k=rng.randint(*words)))
+        if emoji_rate and rng.random() < emoji_rate:
+            message += " " + rng.choice(EMOJIS)
+        if link_rate and rng.random() < link_rate:
+            message += " " + rng.choice(LINKS).format(id=f"{rng.getrandbits(40):x}")
+        if multiline_rate and rng.random() < multiline_rate:
+            message += "\n" + " ".join(rng.choices(vocabulary, k=rng.randint(*words)))
+        yield format_line(timestamp, rng.choice(senders), message, device)
+
+
+def write_export(path, n_lines, device="android", seed=0, **options):
+    """
+    Writes a synthetic chat export to disk.
+
+    Parameters:
+    - path (str): Destination file
+    - n_lines (int): Number of messages to produce
+    - device (str): Device type ('ios' or 'android')
+    - seed (int): Seed of the random generator
+    - options: Further options of generate_lines (senders, words, vocabulary and the rates)
+
+    Returns:
+    - str: The path that was written
+    """
+
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_lines(n_lines, device, seed, **options):
+            f.write(line + "\n")
+    return path
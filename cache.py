@@ -0,0 +1,743 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from pandas.api.types import union_categoricals
+from chat_index import ChatIndex
+from search import SearchIndex
+from instrumentation import cache_event, instrumented
+from preprocessor import compact_schema, open_export, preprocess, sniff_encoding, sniff_format
+from stop_words import STOP_WORDS_VERSION
+from tokens import TOKENIZER_VERSION
+
+# Directory of the parsed-chat cache, overridable through the environment
+CACHE_DIR = os.environ.get("WHATSAPP_WRAP_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "whatsapp_wrap"))
+
+# Total size of the cached chats, their indexes and the images; least recently used entries are evicted above it
+MAX_CACHE_BYTES = int(os.environ.get("WHATSAPP_WRAP_CACHE_BYTES", 2 << 30))
+
+# Size of the reads made while hashing an upload
+HASH_READ_SIZE = 1 << 20
+
+# Memory budget of the memoized analysis results of one session
+RESULT_CACHE_BYTES = int(os.environ.get("WHATSAPP_WRAP_RESULT_CACHE_BYTES", 256 << 20))
+
+# File suffix of the pickled ChatIndex of a chat; its word counts depend on the tokenizer and stop words
+INDEX_SUFFIX = f".words{TOKENIZER_VERSION}-{STOP_WORDS_VERSION}.index.pkl"
+
+# Extensions of the files managed by the cache: parsed chats, their manifests
+# (byte length and rows of the export) and pickled indexes, and rendered images
+CACHE_SUFFIXES = (".parquet", ".json", ".pkl", ".png")
+
+
+def iter_bytes(raw_data):
+    """
+    Yields the content of a chat export as pieces of bytes without loading it all at once.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): The export, as accepted by preprocess
+
+    Returns:
+    - generator: Pieces of the content
+    """
+
+    if isinstance(raw_data, str):
+        yield raw_data.encode("utf-8")
+    elif isinstance(raw_data, bytes):
+        yield raw_data
+    elif hasattr(raw_data, 'read'):
+        raw_data.seek(0)
+        while True:
+            piece = raw_data.read(HASH_READ_SIZE)
+            if not piece:
+                break
+            yield piece.encode("utf-8") if isinstance(piece, str) else piece
+        raw_data.seek(0)
+    else:
+        for line in raw_data:
+            yield line.encode("utf-8")
+            yield b"\n"
+
+
+def content_hashes(raw_data, lengths=()):
+    """
+    Hashes the content of a chat export, and its prefixes of the given lengths, in one pass.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): The export, as accepted by preprocess
+    - lengths (iterable): Byte lengths of the prefixes to hash
+
+    Returns:
+    - tuple: (hex digest of the content, its length in bytes,
+      dict of prefix length -> hex digest of the prefix, for the lengths within the content)
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    cuts = sorted(set(lengths))
+    prefixes = {}
+    position = 0
+    for piece in iter_bytes(raw_data):
+        piece = memoryview(piece)
+        start = 0
+        # Snapshot the digest at every prefix length that falls within this piece
+        while cuts and cuts[0] <= position + len(piece):
+            cut = cuts.pop(0) - position
+            digest.update(piece[start:cut])
+            start = cut
+            prefixes[position + cut] = digest.copy().hexdigest()
+        digest.update(piece[start:])
+        position += len(piece)
+    return digest.hexdigest(), position, prefixes
+
+
+def content_hash(raw_data):
+    """
+    Hashes the content of a chat export without loading it all at once.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): The export, as accepted by preprocess
+
+    Returns:
+    - str: Hex digest of the content
+    """
+
+    return content_hashes(raw_data)[0]
+
+
+def chat_key(raw_data, dialect):
+    """
+    Builds the cache key of an export: the hash of its content plus its detected format.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): The export
+    - dialect (Dialect): Format of the export, see preprocessor.detect_format
+
+    Returns:
+    - str: Cache key, usable as a file name
+    """
+
+    return f"{content_hash(raw_data)}-{dialect_hash(dialect)}"
+
+
+def dialect_hash(dialect):
+    """
+    Returns a short hash of an export format, the suffix of the cache keys.
+    """
+
+    return hashlib.blake2b(repr(tuple(dialect)).encode("utf-8"), digest_size=4).hexdigest()
+
+
+def filter_hash(chat_filter):
+    """
+    Returns a short hash of a parse filter, added to the cache keys of filtered chats.
+    """
+
+    senders = chat_filter.senders
+    fields = chat_filter._replace(
+        start=None if chat_filter.start is None else pd.Timestamp(chat_filter.start),
+        end=None if chat_filter.end is None else pd.Timestamp(chat_filter.end),
+        senders=None if senders is None else tuple(sorted(senders)))
+    return hashlib.blake2b(repr(tuple(fields)).encode("utf-8"), digest_size=4).hexdigest()
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Removes the least recently used cached chats and images until the cache fits in max_bytes.
+
+    The files of a chat (its Parquet file, manifest and index) share the name up to
+    the first dot and are evicted together.
+
+    Parameters:
+    - cache_dir (str): Directory of the cache
+    - max_bytes (int): Size budget of the cache
+    """
+
+    entries = {}
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(CACHE_SUFFIXES):
+            stat = entry.stat()
+            key = entry.name.split(".", 1)[0]
+            mtime, size, paths = entries.get(key, (0, 0, []))
+            entries[key] = (max(mtime, stat.st_mtime), size + stat.st_size, paths + [entry.path])
+
+    total = sum(size for _, size, _ in entries.values())
+    for _, size, paths in sorted(entries.values()):
+        if total <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+
+def write_atomically(path, write):
+    """
+    Writes a cache file under a unique temporary name and moves it into place.
+
+    Readers never see a partial file, and sessions or threads writing the same
+    key at the same time each write their own temporary file; the last one to
+    finish wins.
+
+    Parameters:
+    - path (str): Final path of the file
+    - write (callable): Writes the content to the binary file object it is passed
+    """
+
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def load(key, cache_dir=CACHE_DIR):
+    """
+    Reads a parsed chat back from the cache.
+
+    Parameters:
+    - key (str): Cache key, see chat_key
+    - cache_dir (str): Directory of the cache
+
+    Returns:
+    - pd.DataFrame: The cached DataFrame, or None on a miss
+    """
+
+    path = os.path.join(cache_dir, key + ".parquet")
+    if not os.path.exists(path):
+        return None
+
+    try:
+        df = pd.read_parquet(path, memory_map=True)
+    except Exception as e:
+        print(f"Error reading cached chat {path}: {str(e)}")
+        try:
+            # Another session may have removed or replaced it already
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    # Mark as recently used for the LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def store(key, df, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, length=None):
+    """
+    Writes a parsed chat to the cache and evicts old entries if it grew past its budget.
+
+    Parameters:
+    - key (str): Cache key, see chat_key
+    - df (pd.DataFrame): Output of preprocess
+    - cache_dir (str): Directory of the cache
+    - max_bytes (int): Size budget of the cache
+    - length (int): Byte length of the export; recorded in a manifest so that a
+      longer export of the same chat can be recognised, see extend_chat
+    """
+
+    path = os.path.join(cache_dir, key + ".parquet")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_atomically(path, lambda f: df.to_parquet(f, index=False))
+        if length is not None:
+            manifest = json.dumps({'length': length, 'rows': len(df)}).encode("utf-8")
+            write_atomically(os.path.join(cache_dir, key + ".json"), lambda f: f.write(manifest))
+        evict(cache_dir, max_bytes)
+    except OSError as e:
+        print(f"Error caching parsed chat: {str(e)}")
+
+
+def read_manifests(cache_dir, dialect_suffix):
+    """
+    Returns the byte lengths of the cached exports of one format.
+
+    Parameters:
+    - cache_dir (str): Directory of the cache
+    - dialect_suffix (str): Format hash of the cache keys, see dialect_hash
+
+    Returns:
+    - dict: Cache key -> byte length of the export
+    """
+
+    lengths = {}
+    if not os.path.isdir(cache_dir):
+        return lengths
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith("-" + dialect_suffix + ".json"):
+            try:
+                with open(entry.path) as f:
+                    lengths[entry.name[:-len(".json")]] = json.load(f)['length']
+            except (OSError, ValueError, KeyError):
+                pass
+    return lengths
+
+
+def tail_bytes(raw_data, length):
+    """
+    Returns the content of a chat export after its first length bytes.
+
+    Parameters:
+    - raw_data (str | bytes | binary file-like): The export
+    - length (int): Number of bytes skipped
+
+    Returns:
+    - bytes: The rest of the export
+    """
+
+    if isinstance(raw_data, str):
+        return raw_data.encode("utf-8")[length:]
+    if isinstance(raw_data, bytes):
+        return raw_data[length:]
+    raw_data.seek(length)
+    tail = raw_data.read()
+    raw_data.seek(0)
+    return tail
+
+
+def extend_chat(raw_data, bases, prefixes, dialect, cache_dir=CACHE_DIR, compact=False, chat_filter=None):
+    """
+    Parses only the messages appended to an export that starts with a cached export.
+
+    Parameters:
+    - raw_data (str | bytes | binary file-like): The export
+    - bases (dict): Cache key -> byte length of the cached exports, see read_manifests
+    - prefixes (dict): Byte length -> hash of the export's prefix of that length, see content_hashes
+    - dialect (Dialect): Format of the export
+    - cache_dir (str): Directory of the cache
+    - compact (bool): Whether the cached chats use the compact schema
+    - chat_filter (ChatFilter): Filter the cached chats were parsed with, applied to the new messages
+
+    Returns:
+    - pd.DataFrame: The cached chat followed by the new messages, with the key and row
+      count of the cached chat in attrs ('base_key', 'base_rows'), or None if no cached
+      export is a prefix of this one
+    """
+
+    matches = [(length, key) for key, length in bases.items() if prefixes.get(length) == key.split("-", 1)[0]]
+    if not matches:
+        return None
+
+    # Longest cached prefix, so the fewest messages are parsed
+    length, base_key = max(matches)
+    base = load(base_key, cache_dir)
+    if base is None:
+        return None
+
+    # The tail has no byte order mark of its own, so it is decoded like the whole export
+    tail = preprocess(tail_bytes(raw_data, length), dialect=dialect, compact=compact, chat_filter=chat_filter,
+                      encoding=sniff_encoding(raw_data))
+    if tail is None:
+        return None
+
+    df = pd.concat([base, tail], ignore_index=True)
+    df['Sender'] = union_categoricals([base['Sender'].astype('category'), tail['Sender'].astype('category')])
+    if compact:
+        df = compact_schema(df)
+    df.attrs = {'base_key': base_key, 'base_rows': len(base)}
+    return df
+
+
+@instrumented
+def cached_preprocess(raw_data, device=None, cache_dir=CACHE_DIR, compact=False, chat_filter=None):
+    """
+    Preprocesses a chat export, reusing the parsed result of an identical earlier upload.
+
+    Parsed chats are stored as Parquet files (Sender as a categorical, timestamps
+    as datetime64) keyed by the hash of the export and its detected format, and
+    are memory-mapped back on a hit.
+
+    An export that starts with a cached export of the same chat, such as a later
+    re-export of a group, is recognised by hashing its prefixes of the cached
+    lengths in the same pass as the whole content; only the appended messages are
+    then parsed, see extend_chat.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | list): The export, or a zip archive of it; it is
+      read more than once, so it must not be a one-shot iterator
+    - device (str): Device type ('ios' or 'android'), or None to detect it
+    - cache_dir (str): Directory of the cache
+    - compact (bool): Use the compact schema, see preprocessor.compact_schema; cached
+      separately from the default schema
+    - chat_filter (ChatFilter): Messages to keep, see preprocessor.preprocess; every
+      filter is cached separately
+
+    Returns:
+    - pd.DataFrame: Processed DataFrame as returned by preprocess, or None if the format is not recognised
+    """
+
+    # A zipped export is hashed and parsed from its chat member, decompressed on every read, so
+    # it shares its cache entries with the same chat uploaded as text and never loads the attachments
+    raw_data = open_export(raw_data)
+
+    dialect = sniff_format(raw_data, device)
+    if dialect is None:
+        return preprocess(raw_data, device, compact=compact, chat_filter=chat_filter)
+
+    # Cached exports of the same format, schema and filter; only byte-addressable input can be extended
+    suffix = dialect_hash(dialect) + ("-compact" if compact else "")
+    if chat_filter is not None:
+        suffix += "-" + filter_hash(chat_filter)
+    bases = {}
+    if isinstance(raw_data, (str, bytes)) or (hasattr(raw_data, 'read') and not isinstance(raw_data, io.TextIOBase)):
+        bases = read_manifests(cache_dir, suffix)
+
+    digest, length, prefixes = content_hashes(raw_data, bases.values())
+    key = f"{digest}-{suffix}"
+    df = load(key, cache_dir)
+    cache_event("chats", df is not None)
+    if df is None:
+        df = extend_chat(raw_data, bases, prefixes, dialect, cache_dir, compact, chat_filter)
+        cache_event("chats", "extended" if df is not None else "parsed")
+        if df is None:
+            df = preprocess(raw_data, device, compact=compact, chat_filter=chat_filter)
+            if df is None:
+                return None
+            df['Sender'] = df['Sender'].astype('category')
+
+        store(key, df, cache_dir, length=length)
+    elif compact:
+        # Parquet does not keep every pandas dtype (Arrow strings come back as plain strings)
+        df = compact_schema(df)
+
+    # Lets ResultCache recognise the chat without hashing it again
+    df.attrs['chat_key'] = key
+    return df
+
+
+def load_index(key, df, cache_dir=CACHE_DIR, suffix=INDEX_SUFFIX):
+    """
+    Reads the pickled ChatIndex of a cached chat and attaches its DataFrame.
+
+    Parameters:
+    - key (str): Cache key of the chat
+    - df (pd.DataFrame): The chat, as returned by cached_preprocess
+    - cache_dir (str): Directory of the cache
+    - suffix (str): File suffix of the index, '.search.pkl' for its SearchIndex
+
+    Returns:
+    - ChatIndex | SearchIndex: The index, or None on a miss
+    """
+
+    path = os.path.join(cache_dir, key + suffix)
+    try:
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading cached index {path}: {str(e)}")
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    index.df = df
+    index.attrs = dict(df.attrs)
+    return index
+
+
+def store_index(key, index, cache_dir=CACHE_DIR, suffix=INDEX_SUFFIX):
+    """
+    Pickles the ChatIndex of a cached chat, without its DataFrame.
+
+    Parameters:
+    - key (str): Cache key of the chat
+    - index (ChatIndex | SearchIndex): Its index
+    - cache_dir (str): Directory of the cache
+    - suffix (str): File suffix of the index, '.search.pkl' for its SearchIndex
+    """
+
+    path = os.path.join(cache_dir, key + suffix)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_atomically(path, lambda f: pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"Error caching chat index: {str(e)}")
+
+
+@instrumented
+def cached_index(df, cache_dir=CACHE_DIR):
+    """
+    Returns the ChatIndex of a chat from cached_preprocess, reusing the stored one if any.
+
+    For a chat extended from a cached export (see extend_chat), the index of that
+    export is extended with the new messages instead of being rebuilt.
+
+    Parameters:
+    - df (pd.DataFrame): The chat, as returned by cached_preprocess
+    - cache_dir (str): Directory of the cache
+
+    Returns:
+    - ChatIndex: Index of the chat
+    """
+
+    key = df.attrs.get('chat_key')
+    if key is None:
+        return ChatIndex(df)
+
+    index = load_index(key, df, cache_dir)
+    cache_event("indexes", index is not None)
+    if index is None:
+        base = load_index(df.attrs['base_key'], df, cache_dir) if 'base_key' in df.attrs else None
+        cache_event("indexes", "extended" if base is not None else "built")
+        index = base.extend(df, df.attrs['base_rows']) if base is not None else ChatIndex(df)
+        store_index(key, index, cache_dir)
+    return index
+
+
+@instrumented
+def cached_search_index(df, cache_dir=CACHE_DIR):
+    """
+    Returns the SearchIndex of a chat from cached_preprocess, reusing the stored one if any.
+
+    Parameters:
+    - df (pd.DataFrame): The chat, as returned by cached_preprocess
+    - cache_dir (str): Directory of the cache
+
+    Returns:
+    - SearchIndex: Full-text index of the chat
+    """
+
+    key = df.attrs.get('chat_key')
+    if key is None:
+        return SearchIndex(df)
+
+    index = load_index(key, df, cache_dir, ".search.pkl")
+    cache_event("search_indexes", index is not None)
+    if index is None:
+        index = SearchIndex(df)
+        store_index(key, index, cache_dir, ".search.pkl")
+    return index
+
+
+def estimate_size(value):
+    """
+    Estimates the memory held by an analysis result.
+
+    Parameters:
+    - value: DataFrame, Series, image, or a tuple/list of those
+
+    Returns:
+    - int: Approximate size in bytes
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if hasattr(value, 'nbytes'):
+        # numpy arrays, ChatIndex
+        return int(value.nbytes)
+    if hasattr(value, 'size') and hasattr(value, 'getbands'):
+        # PIL image
+        width, height = value.size
+        return width * height * len(value.getbands())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Memoizes analysis results per (chat, function, arguments) with LRU eviction.
+
+    Results are only memoized for DataFrames returned by cached_preprocess, whose
+    attrs carry the content hash of the chat. Calls may come from several threads;
+    the entries are guarded by a lock, which is not held while a result is computed.
+
+    Indexes (ChatIndex, SearchIndex) keep their chat's DataFrame alive, which their
+    nbytes leaves out. That DataFrame is counted once per chat, for as long as an
+    entry holding it is memoized, so the budget bounds the memory actually kept.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # chat_key -> [size of the DataFrame kept alive by the entries, number of those entries]
+        self.chats = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, func, **kwargs):
+        """
+        Returns func(**kwargs), computing it only if it is not memoized yet.
+
+        Parameters:
+        - func (callable): Analysis function taking the chat as its 'df' argument
+        - kwargs: Arguments of func; all but 'df' must be hashable
+
+        Returns:
+        - The result of func
+        """
+
+        df = kwargs.get('df')
+        chat = df.attrs.get('chat_key') if df is not None else None
+        if chat is None:
+            with self.lock:
+                self.misses += 1
+            cache_event("results", False)
+            return func(**kwargs)
+
+        arguments = tuple(sorted((name, value) for name, value in kwargs.items() if name != 'df'))
+        key = (chat, func.__module__, func.__qualname__, arguments)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                cache_event("results", True)
+                return self.entries[key][0]
+            self.misses += 1
+        cache_event("results", False)
+
+        value = func(**kwargs)
+        size = estimate_size(value)
+        holds_chat = isinstance(getattr(value, 'df', None), pd.DataFrame)
+        with self.lock:
+            chat_size = self.chats[chat][0] if chat in self.chats else None
+        # The DataFrame is only added to the budget by the first entry holding it
+        added = 0
+        if holds_chat and chat_size is None:
+            chat_size = added = estimate_size(value.df)
+        if size + added <= self.max_bytes:
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = (value, size, chat if holds_chat else None)
+                    self.size += size
+                    if holds_chat:
+                        if chat not in self.chats:
+                            self.chats[chat] = [chat_size, 0]
+                            self.size += chat_size
+                        self.chats[chat][1] += 1
+                while self.size > self.max_bytes:
+                    _, (_, evicted_size, held) = self.entries.popitem(last=False)
+                    self.size -= evicted_size
+                    if held is not None:
+                        self.chats[held][1] -= 1
+                        if self.chats[held][1] == 0:
+                            self.size -= self.chats.pop(held)[0]
+        return value
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size}
+
+
+def image_key(*parts):
+    """
+    Builds the cache key of a rendered image from everything it depends on.
+
+    Parameters:
+    - parts: Hashable values, the first being the chat_key of the chat
+
+    Returns:
+    - str: Cache key, usable as a file name, or None if the chat has no chat_key
+    """
+
+    if parts[0] is None:
+        return None
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ImageCache:
+    """
+    Keeps rendered images as PNG files next to the cached chats, with the same LRU eviction.
+
+    Also records the time spent rendering on misses, so the cost of the images
+    and the effect of the cache can be reported. The counters are guarded by a
+    lock, since images are rendered from worker threads of the app.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+
+    def render(self, key, func, **kwargs):
+        """
+        Returns the PNG bytes stored under key, calling func(**kwargs) to render them on a miss.
+
+        Parameters:
+        - key (str): Cache key, see image_key; None renders without caching
+        - func (callable): Renderer returning PNG bytes
+        - kwargs: Arguments of func
+
+        Returns:
+        - bytes: The PNG image
+        """
+
+        path = os.path.join(self.cache_dir, key + ".png") if key is not None else None
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                # Mark as recently used for the LRU eviction
+                os.utime(path)
+                with self.lock:
+                    self.hits += 1
+                cache_event("images", True)
+                return data
+            except OSError:
+                pass
+
+        cache_event("images", False)
+        start = time.perf_counter()
+        data = func(**kwargs)
+        with self.lock:
+            self.misses += 1
+            self.render_seconds += time.perf_counter() - start
+            self.renders += 1
+
+        if path is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                write_atomically(path, lambda f: f.write(data))
+                evict(self.cache_dir, self.max_bytes)
+            except OSError as e:
+                print(f"Error caching rendered image: {str(e)}")
+        return data
+
+    def stats(self):
+        """
+        Returns the hit/miss counters, the hit rate and the time spent rendering.
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'renders': self.renders,
+                'render_seconds': self.render_seconds,
+                'mean_render_seconds': self.render_seconds / self.renders if self.renders else 0.0,
+            }
@@ -0,0 +1,252 @@
+import numpy as np
+import pandas as pd
+from links import find_links
+from preprocessor import column
+from tokens import extract_emojis, ranked, word_frequencies
+
+# Pre-aggregated message counts: table name -> columns they are grouped by
+TABLES = {
+    'daily': ['Date'],
+    'monthly': ['year', 'month'],
+    'weekday': ['day_name'],
+    'month': ['month'],
+    'heatmap': ['day_name', 'hour_with_ampm'],
+}
+
+# Count tables ordered by frequency rather than by their keys
+RANKED = ['domains', 'words', 'emoji']
+
+
+def merge_counts(left, right, rank=False):
+    """
+    Adds two per-sender count tables.
+
+    Parameters:
+    - left (dict): Sender name -> pd.Series of counts
+    - right (dict): Sender name -> pd.Series of counts
+    - rank (bool): Sort the merged counts most frequent first instead of by key
+
+    Returns:
+    - dict: Sender name -> pd.Series of summed counts
+    """
+
+    merged = {}
+    for user in left.keys() | right.keys():
+        if user in left and user in right:
+            counts = left[user].add(right[user], fill_value=0).astype('int64')
+            merged[user] = ranked(counts) if rank else counts.sort_index()
+        else:
+            merged[user] = left[user] if user in left else right[user]
+    return merged
+
+
+def per_sender_sum(per_sender):
+    """
+    Sums the counts of every sender into the counts of the whole chat.
+    """
+
+    if not per_sender:
+        return pd.Series(dtype='int64')
+    return ranked(pd.concat(per_sender.values()).groupby(level=0).sum())
+
+
+class ChatIndex:
+    """
+    Per-sender index of a preprocessed chat, built once in a single pass.
+
+    Holds the rows of every sender as offset ranges into one sorted array, the
+    message/word/media/link totals of every sender, and per-sender count tables:
+    group-by counts of the messages, the domains of the shared links, and word
+    and emoji frequencies. The analyser and WordCloudGenerator functions accept a
+    ChatIndex in place of the DataFrame and answer by slicing these instead of
+    scanning the whole chat for every call.
+
+    The index is picklable without its DataFrame, and extend() builds the index of
+    a longer export of the same chat by aggregating only the new messages.
+    """
+
+    def __init__(self, df):
+        """
+        Parameters:
+        - df (pd.DataFrame): Output of preprocess
+        """
+
+        self.df = df
+        self.attrs = dict(df.attrs)
+        sender = self._index_rows(df)
+        self._aggregate(df, sender)
+
+    def __getstate__(self):
+        # The DataFrame is stored separately (see cache.py) and attached again after loading
+        state = self.__dict__.copy()
+        state['df'] = None
+        return state
+
+    def _index_rows(self, df):
+        """
+        Sorts the row positions by sender and returns the 'Sender' column as a categorical.
+        """
+
+        # Row positions of every sender: order[offsets[i]:offsets[i + 1]]
+        sender = df['Sender'].astype('category')
+        codes = sender.cat.codes.to_numpy()
+        self.senders = sender.cat.categories
+        self.order = np.argsort(codes, kind='stable')
+        self.offsets = np.searchsorted(codes[self.order], np.arange(len(self.senders) + 1))
+        return sender
+
+    def _aggregate(self, df, sender):
+        """
+        Computes the per-sender totals and count tables of df.
+        """
+
+        # Every link of the chat, with the sender of its message
+        self.links = find_links(df['Message'])
+        self.links['Sender'] = sender.take(self.links['row']).to_numpy()
+
+        # Per-message counts, summed per sender
+        counts = pd.DataFrame({
+            'Sender': sender,
+            'messages': 1,
+            'words': df['Message'].str.split().str.len(),
+            'media': df['Message'].str.contains("<Media omitted>", na=False).to_numpy(dtype=bool),
+            'links': np.bincount(self.links['row'], minlength=len(df))
+        })
+        self.totals = counts.groupby('Sender', observed=True)[['messages', 'words', 'media', 'links']].sum()
+        self.totals.index = self.totals.index.astype(object)
+
+        self.tables = {}
+        for name, keys in TABLES.items():
+            table = df.groupby([sender] + [column(df, key) for key in keys], observed=True).size()
+            per_sender = {user: part.droplevel(0) for user, part in table.groupby(level=0, observed=True)}
+            per_sender["Whole Group"] = table.groupby(level=keys, observed=True).sum()
+            self.tables[name] = per_sender
+
+        # Links per domain, most shared first
+        domains = self.links.groupby(['Sender', 'Domain'], observed=True).size()
+        per_sender = {user: ranked(part.droplevel(0)) for user, part in domains.groupby(level=0, observed=True)}
+        per_sender["Whole Group"] = per_sender_sum(per_sender)
+        self.tables['domains'] = per_sender
+
+        # Word (without stop words) and emoji frequencies, one tokenizer pass per sender
+        words, emojis = {}, {}
+        for position, user in enumerate(self.senders):
+            rows = self.order[self.offsets[position]:self.offsets[position + 1]]
+            if len(rows):
+                messages = df['Message'].take(rows)
+                words[user] = word_frequencies(messages)
+                emojis[user] = ranked(pd.Series(extract_emojis(messages), dtype=object).value_counts())
+        words["Whole Group"] = per_sender_sum(words)
+        emojis["Whole Group"] = per_sender_sum(emojis)
+        self.tables['words'] = words
+        self.tables['emoji'] = emojis
+
+    def extend(self, df, base_rows):
+        """
+        Builds the index of a longer export of this chat, aggregating only its new rows.
+
+        The counts of the new rows are added to the ones of this index instead of
+        being recomputed; only the row order, a single argsort, covers the whole chat.
+
+        Parameters:
+        - df (pd.DataFrame): Output of preprocess whose first base_rows rows are the chat of this index
+        - base_rows (int): Number of rows of the chat of this index
+
+        Returns:
+        - ChatIndex: Index of df
+        """
+
+        tail = ChatIndex(df.iloc[base_rows:].reset_index(drop=True))
+
+        merged = ChatIndex.__new__(ChatIndex)
+        merged.df = df
+        merged.attrs = dict(df.attrs)
+        merged._index_rows(df)
+
+        links = tail.links.copy()
+        links['row'] += base_rows
+        merged.links = pd.concat([self.links, links], ignore_index=True)
+        merged.totals = self.totals.add(tail.totals, fill_value=0).astype('int64')
+        merged.tables = {name: merge_counts(self.tables[name], tail.tables[name], rank=name in RANKED)
+                         for name in self.tables}
+        return merged
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the index itself, excluding the DataFrame it refers to.
+        """
+
+        tables = sum(int(part.memory_usage(deep=True)) for per_sender in self.tables.values()
+                     for part in per_sender.values())
+        return (self.order.nbytes + self.offsets.nbytes + int(self.totals.memory_usage(deep=True).sum())
+                + int(self.links.memory_usage(deep=True).sum()) + tables)
+
+    def rows(self, selected_user):
+        """
+        Returns the row positions of a sender's messages in chat order.
+
+        Parameters:
+        - selected_user (str): Sender name, or 'Whole Group' for every row
+
+        Returns:
+        - np.ndarray: Row positions into the DataFrame
+        """
+
+        if selected_user == "Whole Group":
+            return np.arange(len(self.df))
+        position = self.senders.get_indexer([selected_user])[0]
+        if position == -1:
+            return np.empty(0, dtype=np.intp)
+        return self.order[self.offsets[position]:self.offsets[position + 1]]
+
+    def messages(self, selected_user):
+        """
+        Returns the 'Message' column of a sender's rows.
+
+        Parameters:
+        - selected_user (str): Sender name, or 'Whole Group' for every message
+
+        Returns:
+        - pd.Series: The messages
+        """
+
+        if selected_user == "Whole Group":
+            return self.df['Message']
+        return self.df['Message'].take(self.rows(selected_user))
+
+    def counts(self, name, selected_user):
+        """
+        Returns a pre-aggregated count table of a sender.
+
+        Parameters:
+        - name (str): Table name, one of TABLES, 'domains', 'words' or 'emoji'
+        - selected_user (str): Sender name, or 'Whole Group' for the whole chat
+
+        Returns:
+        - pd.Series: Counts indexed by the table's group-by columns, or by domain/word/emoji
+        """
+
+        per_sender = self.tables[name]
+        if selected_user in per_sender:
+            return per_sender[selected_user]
+        # Unknown sender: an empty table with the same index levels
+        return per_sender["Whole Group"].iloc[:0]
+
+    def total(self, column, selected_user):
+        """
+        Returns the total number of messages, words, media files or links of a sender.
+
+        Parameters:
+        - column (str): 'messages', 'words', 'media' or 'links'
+        - selected_user (str): Sender name, or 'Whole Group' for the whole chat
+
+        Returns:
+        - int: The total
+        """
+
+        if selected_user == "Whole Group":
+            return self.totals[column].sum()
+        if selected_user not in self.totals.index:
+            return 0
+        return self.totals.at[selected_user, column]
@@ -0,0 +1,135 @@
+"""
+Conversation sessions and reply latencies of a chat.
+
+Everything is computed from the sorted timestamp array with NumPy diffs: a new
+session starts wherever the gap to the previous message exceeds the idle gap,
+and a message replies to the previous one when their senders differ within a
+session. Grouping uses bincount and one integer sort, so no Python loop runs
+over the messages.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from chat_index import ChatIndex
+from instrumentation import instrumented
+
+# Silence after which the next message starts a new conversation
+IDLE_GAP = pd.Timedelta(hours=1)
+
+# Tables of conversation_analysis
+Conversations = namedtuple('Conversations', ['sessions', 'daily', 'senders', 'matrix'])
+
+
+def group_quantiles(codes, values, n_groups, quantiles):
+    """
+    Computes quantiles of values per group with a single sort, interpolating linearly like np.quantile.
+
+    Parameters:
+    - codes (np.ndarray): Group of every value, in range(n_groups)
+    - values (np.ndarray): Non-negative int64 values
+    - n_groups (int): Number of groups
+    - quantiles (list): Quantiles to compute, between 0 and 1
+
+    Returns:
+    - np.ndarray: Float array of shape (len(quantiles), n_groups), NaN for empty groups
+    """
+
+    counts = np.bincount(codes, minlength=n_groups)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    # Sort by (group, value) as one integer key when both fit in 63 bits
+    bits = int(values.max()).bit_length() if len(values) else 0
+    if bits + int(n_groups).bit_length() < 63:
+        ordered = np.sort((codes.astype(np.int64) << bits) | values) & ((1 << bits) - 1)
+    else:
+        ordered = values[np.lexsort((values, codes))]
+
+    result = np.full((len(quantiles), n_groups), np.nan)
+    present = counts > 0
+    for row, q in enumerate(quantiles):
+        position = offsets[:-1][present] + (counts[present] - 1) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result[row, present] = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+    return result
+
+
+@instrumented
+def conversation_analysis(df, idle_gap=IDLE_GAP):
+    """
+    Segments a chat into conversation sessions and measures who replies to whom and how fast.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): DataFrame containing chat data with 'timestamp' and 'Sender' columns, or its index
+    - idle_gap (pd.Timedelta): Silence after which a message starts a new session
+
+    Returns:
+    - Conversations:
+      - sessions (pd.DataFrame): One row per session with its 'start', 'end', 'duration',
+        number of 'messages' and 'replies', and the 'starter'
+      - daily (pd.DataFrame): Number of sessions started on every 'Date'
+      - senders (pd.DataFrame): Per sender, the 'messages', 'replies' sent, 'median_reply'
+        and 'p90_reply' latencies, and 'sessions_started'
+      - matrix (pd.DataFrame): Replies from every responder (columns) to every sender (rows)
+    """
+
+    if isinstance(df, ChatIndex):
+        df = df.df
+
+    timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    sender = df['Sender'].astype('category')
+    codes = sender.cat.codes.to_numpy().astype(np.intp)
+    names = sender.cat.categories
+    # Exports are chronological; only reorder if that is not the case
+    if len(timestamps) > 1 and (np.diff(timestamps) < 0).any():
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, codes = timestamps[order], codes[order]
+
+    n_senders = len(names)
+    gaps = np.diff(timestamps)
+    starts = np.empty(len(timestamps), dtype=bool)
+    starts[:1] = True
+    starts[1:] = gaps > idle_gap.value
+
+    # A reply is the first message of another sender within the same session
+    replies = np.zeros(len(timestamps), dtype=bool)
+    replies[1:] = (codes[1:] != codes[:-1]) & ~starts[1:]
+    reply_rows = np.flatnonzero(replies)
+    latencies = gaps[reply_rows - 1]
+    responders = codes[reply_rows]
+    replied_to = codes[reply_rows - 1]
+
+    # Sessions
+    first = np.flatnonzero(starts)
+    # An empty chat has no sessions, and every table below comes out empty
+    last = np.append(first[1:], len(timestamps)) - 1 if len(first) else first
+    start_times = pd.to_datetime(timestamps[first])
+    sessions = pd.DataFrame({
+        'start': start_times,
+        'end': pd.to_datetime(timestamps[last]),
+        'duration': pd.to_timedelta(timestamps[last] - timestamps[first]),
+        'messages': last - first + 1,
+        'replies': np.add.reduceat(replies, first) if len(first) else np.empty(0, dtype=np.int64),
+        'starter': pd.Categorical.from_codes(codes[first], names),
+    })
+    daily = start_times.normalize().value_counts().sort_index().rename_axis('Date').reset_index(name='Sessions')
+
+    # Per-sender reply latencies and session starts
+    median, p90 = group_quantiles(responders, latencies, n_senders, [0.5, 0.9])
+    senders = pd.DataFrame({
+        'messages': np.bincount(codes, minlength=n_senders),
+        'replies': np.bincount(responders, minlength=n_senders),
+        'median_reply': pd.to_timedelta(median, unit='ns').round('s'),
+        'p90_reply': pd.to_timedelta(p90, unit='ns').round('s'),
+        'sessions_started': np.bincount(codes[first], minlength=n_senders),
+    }, index=pd.Index(names, name='Sender', dtype=object))
+
+    matrix = np.bincount(replied_to * n_senders + responders, minlength=n_senders * n_senders)
+    matrix = pd.DataFrame(matrix.reshape(n_senders, n_senders),
+                          index=pd.Index(names, name='Replied to', dtype=object),
+                          columns=pd.Index(names, name='Responder', dtype=object))
+
+    return Conversations(sessions, daily, senders, matrix)
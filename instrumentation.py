@@ -0,0 +1,280 @@
+"""
+Per-stage timing, memory and cache instrumentation of the analysis pipeline.
+
+preprocess and the public functions of analyser.py and WordCloudGenerator.py are
+wrapped with @instrumented. Every call is logged at DEBUG level on the
+'whatsapp_wrap.metrics' logger as one JSON object per line, and recorded in the
+Metrics of the run collecting them, if any:
+
+    with collect() as metrics:
+        ...
+    metrics.summary()
+
+The caches report their hits and misses with cache_event(). A run can also
+capture a cProfile profile and tracemalloc allocations
+(collect(Metrics(profile=True, trace_memory=True))); worker threads take part
+in the profile through thread_profile().
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Structured log of every instrumented call
+LOGGER = logging.getLogger("whatsapp_wrap.metrics")
+
+# Metrics of the run being collected in this context, see collect()
+CURRENT = contextvars.ContextVar("whatsapp_wrap_metrics", default=None)
+
+# Number of functions listed in a profile report
+PROFILE_LINES = 30
+
+# From Python 3.12 on, cProfile is built on sys.monitoring: one enabled profile sees every
+# thread, and enabling a second one while it runs raises ValueError
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB, or None where it is not available.
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rows_of(value):
+    """
+    Returns the number of messages of a DataFrame or ChatIndex, or None for other values.
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(getattr(value, 'df', None), pd.DataFrame):
+        return len(value.df)
+    return None
+
+
+class Metrics:
+    """
+    Stage records and cache counters of one run.
+
+    Stages may be recorded from several threads, so records are appended under a lock.
+    """
+
+    def __init__(self, profile=False, trace_memory=False):
+        """
+        Parameters:
+        - profile (bool): Capture a cProfile profile of the run
+        - trace_memory (bool): Trace allocations with tracemalloc, which slows the run down
+        """
+
+        self.lock = threading.Lock()
+        self.stages = []
+        self.counters = Counter()
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profiles = []
+        self.profiling = False
+        self.profile_error = None
+        self.traced_peak_mb = None
+        self.seconds = 0.0
+
+    def add(self, record):
+        with self.lock:
+            self.stages.append(record)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def summary(self):
+        """
+        Returns the metrics of the run as a plain dict.
+
+        Returns:
+        - dict: 'seconds' spent collecting, 'stages' (one record per call, in completion order),
+          'totals' (calls and seconds per stage), 'counters' (cache hits and misses) and
+          'traced_peak_mb' when memory was traced
+        """
+
+        with self.lock:
+            stages = list(self.stages)
+            counters = dict(self.counters)
+        totals = defaultdict(lambda: {'calls': 0, 'seconds': 0.0})
+        for record in stages:
+            totals[record['stage']]['calls'] += 1
+            totals[record['stage']]['seconds'] += record['seconds']
+        return {'seconds': self.seconds, 'stages': stages, 'totals': dict(totals), 'counters': counters,
+                'traced_peak_mb': self.traced_peak_mb}
+
+    def profile_report(self, lines=PROFILE_LINES, sort='cumulative'):
+        """
+        Returns the profile of the run, merged over its threads, as text.
+
+        Parameters:
+        - lines (int): Number of functions listed
+        - sort (str): pstats sort key
+
+        Returns:
+        - str: The report, or None if the run was not profiled
+        """
+
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=out)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.sort_stats(sort).print_stats(lines)
+        return out.getvalue()
+
+
+@contextlib.contextmanager
+def thread_profile():
+    """
+    Profiles the current thread for the run being collected, if it is profiled.
+
+    Before Python 3.12, cProfile only sees the thread it is enabled in, so every
+    worker thread of a profiled run wraps its work in this; the profiles are merged
+    in profile_report. From 3.12 on, the profile enabled by collect() already sees
+    every thread, so the workers' calls do nothing.
+
+    If the profile cannot be enabled, e.g. because another run of the process is
+    being profiled, the run goes on unprofiled and the reason is kept in
+    metrics.profile_error.
+    """
+
+    metrics = CURRENT.get()
+    if metrics is None or not metrics.profile or (PROFILES_ALL_THREADS and metrics.profiling):
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        metrics.profile_error = str(e)
+        yield
+        return
+    metrics.profiling = True
+    try:
+        yield
+    finally:
+        profile.disable()
+        metrics.profiling = False
+        with metrics.lock:
+            metrics.profiles.append(profile)
+
+
+@contextlib.contextmanager
+def collect(metrics=None):
+    """
+    Collects the metrics of the instrumented calls made in this context.
+
+    Work submitted to threads is included if it runs in a copy of this context
+    (contextvars.copy_context().run). The same Metrics may collect several
+    blocks of code, e.g. the parse and the later analysis of one chat.
+
+    Parameters:
+    - metrics (Metrics): Metrics to add to, which also choose whether the run is
+      profiled and its memory traced; None starts new, plain ones
+
+    Returns:
+    - contextmanager: Yields the Metrics of the run
+    """
+
+    if metrics is None:
+        metrics = Metrics()
+    token = CURRENT.set(metrics)
+    # tracemalloc slows every allocation down, so it only runs while collecting
+    tracing = metrics.trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with thread_profile():
+            yield metrics
+    finally:
+        metrics.seconds += time.perf_counter() - start
+        if metrics.trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            metrics.traced_peak_mb = max(peak, metrics.traced_peak_mb or 0.0)
+        if tracing:
+            tracemalloc.stop()
+        CURRENT.reset(token)
+
+
+def cache_event(cache, hit):
+    """
+    Counts a hit or a miss of a cache in the run being collected.
+
+    Parameters:
+    - cache (str): Name of the cache, e.g. 'results'
+    - hit (bool | str): Whether the lookup hit, or the name of the outcome
+    """
+
+    metrics = CURRENT.get()
+    if metrics is not None:
+        outcome = hit if isinstance(hit, str) else "hits" if hit else "misses"
+        metrics.count(f"{cache}.{outcome}")
+
+
+def instrumented(func):
+    """
+    Records the wall time, rows and memory of every call of func.
+
+    The record holds the stage name (module.function), the thread, the seconds
+    taken, the number of messages of the chat passed in (or returned, for
+    preprocess), the peak RSS of the process after the call, and the memory
+    allocated and still held by the call when the run traces memory. Without a
+    run collecting metrics and with the DEBUG log off, only the time is taken.
+    """
+
+    stage = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = CURRENT.get()
+        logging_on = LOGGER.isEnabledFor(logging.DEBUG)
+        traced = metrics is not None and metrics.trace_memory and tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if traced else None
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+        if metrics is not None or logging_on:
+            rows = next((rows for rows in map(rows_of, list(args) + list(kwargs.values())) if rows is not None),
+                        rows_of(result))
+            record = {'stage': stage, 'thread': threading.current_thread().name, 'seconds': seconds,
+                      'rows': rows, 'rss_mb': peak_rss_mb()}
+            if traced:
+                record['allocated_mb'] = (tracemalloc.get_traced_memory()[0] - before) / 2**20
+            if metrics is not None:
+                metrics.add(record)
+            if logging_on:
+                LOGGER.debug(json.dumps(record))
+        return result
+
+    return wrapper
@@ -0,0 +1,86 @@
+import re
+import numpy as np
+import pandas as pd
+from urlextract import URLExtract
+
+# Shared extractor: its TLD list is loaded once instead of once per message
+URL_EXTRACTOR = URLExtract()
+
+# Cheap pre-filter: every link has a dot followed by a letter ("https://x.com", "www.x", "x.in")
+LINK_CANDIDATE = r'\.[A-Za-z]'
+
+# Words of a candidate message that may be links
+URL_TOKEN = re.compile(r'\S*\.[A-Za-z]\S*')
+
+# Links with a scheme or a www. prefix, taken as they are without a TLD check
+EXPLICIT_URL = re.compile(r'(?:https?://|www\.)[^\s<>"]+', re.IGNORECASE)
+
+# Punctuation around a link that belongs to the sentence
+LEADING_PUNCTUATION = '([{\'"'
+TRAILING_PUNCTUATION = '.,;:!?)]}\'"'
+
+# Host name of a link, without scheme, credentials, www. or port
+DOMAIN = r'^(?:[A-Za-z][A-Za-z0-9+.-]*://)?(?:[^@/\s]*@)?(?:www\.)?([^/:?#\s]+)'
+
+
+def token_link(token, hosts):
+    """
+    Returns the link held by a word, if any.
+
+    Words with a scheme or www. are links as they are; other dotted words are
+    only links if the shared URLExtract recognises their host name, which is
+    checked once per distinct host.
+
+    Parameters:
+    - token (str): A whitespace-delimited word
+    - hosts (dict): Host name -> whether it is a link, filled in as hosts are checked
+
+    Returns:
+    - str: The link, or None
+    """
+
+    match = EXPLICIT_URL.search(token)
+    if match:
+        return match.group().rstrip(TRAILING_PUNCTUATION)
+
+    link = token.lstrip(LEADING_PUNCTUATION).rstrip(TRAILING_PUNCTUATION)
+    host = link.split('/', 1)[0]
+    if host not in hosts:
+        hosts[host] = bool(URL_EXTRACTOR.find_urls(host))
+    return link if hosts[host] else None
+
+
+def find_links(messages):
+    """
+    Finds the links of a set of messages.
+
+    Vectorized str.contains calls keep only the messages with a dot followed by
+    a letter, testing the plain dot first since it is much cheaper than the
+    pattern; their dotted words are factorized so every distinct word is
+    checked once, however often it is repeated in the chat.
+
+    Parameters:
+    - messages (pd.Series): Chat messages
+
+    Returns:
+    - pd.DataFrame: One row per link with the position of its message ('row'), the 'URL' and its 'Domain'
+    """
+
+    dotted = np.flatnonzero(messages.str.contains('.', regex=False, na=False).to_numpy(dtype=bool))
+    dotted_messages = messages.take(dotted)
+    candidates = dotted[dotted_messages.str.contains(LINK_CANDIDATE, regex=True, na=False).to_numpy(dtype=bool)]
+    tokens = pd.Series(messages.take(candidates).tolist(), index=candidates, dtype=object)
+    tokens = tokens.str.findall(URL_TOKEN).explode().dropna()
+
+    codes, words = pd.factorize(tokens)
+    hosts = {}
+    urls = pd.Series([token_link(word, hosts) for word in words], dtype=object)
+    found = urls.notna().to_numpy()
+    domains = urls[found].str.extract(DOMAIN, flags=re.IGNORECASE, expand=False).str.lower()
+
+    keep = found[codes]
+    return pd.DataFrame({
+        'row': tokens.index.to_numpy()[keep].astype(np.int64),
+        'URL': urls.to_numpy()[codes[keep]],
+        'Domain': domains.reindex(urls.index).to_numpy()[codes[keep]]
+    })
@@ -1,106 +1,758 @@
+import io
+import itertools
+import os
+import zipfile
+from collections import Counter, namedtuple
+import numpy as np
 import pandas as pd
 import regex as re
 import datetime
+from instrumentation import instrumented
 
-def preprocess(raw_data, device):
+# Number of characters read from the export per block. Every block is parsed with
+# a single regex pass, so this bounds the text held in memory at once.
+BLOCK_SIZE = 1 << 22
+
+# Number of lines of the export inspected to detect its format
+SAMPLE_LINES = 1000
+
+# Number of bytes of the export inspected to detect its encoding
+ENCODING_SAMPLE = 1 << 16
+
+# Byte order marks and the encoding they announce; UTF-32 first, as its little-endian BOM starts like UTF-16's
+BYTE_ORDER_MARKS = [(b'\xff\xfe\x00\x00', 'utf-32-le'), (b'\x00\x00\xfe\xff', 'utf-32-be'),
+                    (b'\xef\xbb\xbf', 'utf-8'), (b'\xff\xfe', 'utf-16-le'), (b'\xfe\xff', 'utf-16-be')]
+
+# Undecodable bytes become U+FFFD instead of failing the whole parse
+DECODE_ERRORS = "replace"
+
+# First bytes of a zip archive, as WhatsApp shares an export with its attachments
+ZIP_MAGIC = b'PK\x03\x04'
+
+# Format of an export: who produced it and how its timestamps are written
+Dialect = namedtuple('Dialect', ['device', 'day_first', 'separator', 'year_digits', 'twelve_hour', 'seconds'])
+
+# Messages kept by preprocess; fields left as None/False do not filter. 'start' is
+# inclusive and 'end' exclusive, both as anything pd.Timestamp accepts.
+ChatFilter = namedtuple('ChatFilter', ['start', 'end', 'senders', 'exclude_media', 'exclude_system'],
+                        defaults=(None, None, None, False, False))
+
+# Placeholders of the media left out of an export, as Android and iOS write them
+MEDIA_MESSAGE = r'^\u200e?(?:<Media omitted>|(?:image|video|audio|sticker|GIF|document) omitted)'
+
+# Messages written by WhatsApp rather than by their sender
+SYSTEM_MESSAGES = ['This message was deleted', 'You deleted this message', 'Waiting for this message',
+                   'Missed voice call', 'Missed video call', 'null']
+
+# Loose timestamp pattern used only to detect the format of an export
+SNIFF_PATTERN = re.compile(r'''
+    [^\S\n]*‎?(\[)?                             # iOS wraps the timestamp in brackets
+    (\d{1,2})([/.\-])(\d{1,2})[/.\-](\d{2}|\d{4}),?[^\S\n]*  # Date
+    \d{1,2}:\d{2}(:\d{2})?[^\S\n]*             # Time, with optional seconds
+    ([AaPp]\.?[Mm]\.?)?                        # AM/PM
+    \]?[^\S\n]*(-)?                            # Android separates timestamp and sender with a dash
+''', re.VERBOSE)
+
+# Sender and message following the timestamp. The message runs over every
+# following line that does not itself start with a timestamp (multi-line messages).
+SENDER_MESSAGE = r'''
+    ([^:\n]+):[^\S\n]*                # Sender name
+    (.+(?:\n(?!{timestamp}).*)*)      # Message content and its continuation lines
+'''
+
+# Date strptime() assigns to a time without a date
+TIME_EPOCH = np.datetime64('1900-01-01')
+
+# '%I %p' label of every hour of the day
+HOUR_LABELS = np.array([datetime.time(hour).strftime('%I %p') for hour in range(24)], dtype=object)
+
+# Name of every month (January first) and weekday (Monday first), as .dt.month_name()/.dt.day_name() write them
+MONTH_LABELS = np.array(pd.date_range('2000-01-01', periods=12, freq='MS').month_name(), dtype=object)
+DAY_LABELS = np.array(pd.date_range('2024-01-01', periods=7, freq='D').day_name(), dtype=object)
+
+# Compact schema: low-cardinality text columns as categoricals, calendar fields
+# in the smallest integer type that holds them, messages as Arrow strings, and
+# no 'Date'/'Time' columns, which are derived from 'timestamp' when needed
+CATEGORY_COLUMNS = ['Sender', 'month', 'day_name', 'hour_with_ampm']
+CALENDAR_DTYPES = {'day': 'int8', 'year': 'int16', 'minute': 'int8'}
+MESSAGE_DTYPE = 'string[pyarrow]'
+
+# Columns left out of the compact schema, derived from 'timestamp' on demand
+DERIVED_COLUMNS = {
+    'Date': lambda timestamp: timestamp.dt.normalize(),
+    'Time': lambda timestamp: timestamp.dt.time,
+}
+
+
+def detect_format(sample, device=None):
+    """
+    Detects the dialect of an export from a sample of its lines.
+
+    Parameters:
+    - sample (str): Text from the start of the export
+    - device (str): Device type ('ios' or 'android') if known, None to detect it as well
+
+    Returns:
+    - Dialect: The detected format, or None if no line of the sample has a timestamp
+    """
+
+    matches = [SNIFF_PATTERN.match(line) for line in sample.split("\n", SAMPLE_LINES)[:SAMPLE_LINES]]
+    matches = [match for match in matches if match]
+    if not matches:
+        return None
+
+    def majority(values):
+        return Counter(values).most_common(1)[0][0]
+
+    if device is None:
+        device = "ios" if majority(match.group(1) is not None for match in matches) else "android"
+
+    firsts = [int(match.group(2)) for match in matches]
+    seconds = [int(match.group(4)) for match in matches]
+    if max(firsts) > 12:
+        day_first = True
+    elif max(seconds) > 12:
+        day_first = False
+    else:
+        # Consecutive messages are chronological, so the day changes more often than the month
+        changes = Counter()
+        for previous, current in zip(matches, matches[1:]):
+            changes['first'] += previous.group(2) != current.group(2)
+            changes['second'] += previous.group(4) != current.group(4)
+        day_first = changes['first'] >= changes['second']
+
+    return Dialect(
+        device=device,
+        day_first=day_first,
+        separator=majority(match.group(3) for match in matches),
+        year_digits=majority(len(match.group(5)) for match in matches),
+        twelve_hour=majority(match.group(7) is not None for match in matches),
+        seconds=majority(match.group(6) is not None for match in matches)
+    )
+
+
+def sniff_format(raw_data, device=None):
+    """
+    Detects the format of an export from its first block, without parsing it.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): Raw chat data, see iter_blocks
+    - device (str): Device type ('ios' or 'android'), or None to detect it
+
+    Returns:
+    - Dialect: The detected format, or None if it is not recognised
+    """
+
+    blocks = iter_blocks(raw_data)
+    try:
+        return detect_format(next(blocks, ""), device.lower() if device else None)
+    finally:
+        blocks.close()
+
+
+def timestamp_pattern(dialect):
+    """
+    Builds the timestamp pattern of a dialect.
+
+    Parameters:
+    - dialect (Dialect): Format of the export
+
+    Returns:
+    - str: Verbose pattern with date, time and AM/PM groups (the AM/PM group is empty for 24-hour clocks)
+    """
+
+    separator = re.escape(dialect.separator)
+    return ''.join([
+        r'[^\S\n]*‎?\[' if dialect.device == "ios" else r'[^\S\n]*‎?',
+        rf'(\d{{1,2}}{separator}\d{{1,2}}{separator}\d{{{dialect.year_digits}}}),?[^\S\n]*',
+        r'(\d{1,2}:\d{2}:\d{2})' if dialect.seconds else r'(\d{1,2}:\d{2})',
+        r'[^\S\n]*([AaPp]\.?[Mm]\.?)' if dialect.twelve_hour else r'()',
+        r'\][^\S\n]*' if dialect.device == "ios" else r'[^\S\n]*-[^\S\n]*',
+        '\n'
+    ])
+
+
+def datetime_formats(dialect):
+    """
+    Builds the explicit strptime formats of a dialect, so pandas never has to infer them.
+
+    Parameters:
+    - dialect (Dialect): Format of the export
+
+    Returns:
+    - tuple: Formats of the date and of '<time><AM/PM>'
+    """
+
+    day_month = ['%d', '%m'] if dialect.day_first else ['%m', '%d']
+    date_format = dialect.separator.join(day_month + ['%y' if dialect.year_digits == 2 else '%Y'])
+    time_format = ('%I' if dialect.twelve_hour else '%H') + ':%M' + (':%S' if dialect.seconds else '')
+    return date_format, time_format + ('%p' if dialect.twelve_hour else '')
+
+
+def _non_capturing(pattern):
+    """
+    Turns every capturing group of a pattern into a non-capturing one.
+    """
+
+    return re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+
+
+def compile_patterns(dialect):
+    """
+    Compiles the block-level patterns of a dialect.
+
+    Parameters:
+    - dialect (Dialect): Format of the export
+
+    Returns:
+    - tuple: (message regex, timestamp regex), both anchored at line starts
+    """
+
+    timestamp = timestamp_pattern(dialect)
+    message = SENDER_MESSAGE.replace('{timestamp}', _non_capturing(timestamp))
+    flags = re.VERBOSE | re.MULTILINE
+    return re.compile('^' + timestamp + message, flags), re.compile('^' + timestamp, flags)
+
+
+def detect_encoding(head):
+    """
+    Detects the encoding of an export from its first bytes.
+
+    A byte order mark decides it; without one, UTF-16 shows as a NUL byte next to
+    every ASCII character of the timestamps. Anything else is read as UTF-8.
+
+    Parameters:
+    - head (bytes): First bytes of the export
+
+    Returns:
+    - str: Name of the codec, without BOM handling (see iter_blocks)
+    """
+
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(bom):
+            return encoding
+    if len(head) >= 2:
+        if head[1::2].count(0) > len(head) // 4:
+            return 'utf-16-le'
+        if head[0::2].count(0) > len(head) // 4:
+            return 'utf-16-be'
+    return 'utf-8'
+
+
+def sniff_encoding(raw_data):
+    """
+    Detects the encoding of binary chat data, see detect_encoding.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): Raw chat data, see iter_blocks
+
+    Returns:
+    - str: Name of the codec; 'utf-8' for text input and unseekable files
+    """
+
+    if isinstance(raw_data, bytes):
+        return detect_encoding(raw_data[:ENCODING_SAMPLE])
+    if not hasattr(raw_data, 'read') or not hasattr(raw_data, 'seek') or isinstance(raw_data, io.TextIOBase):
+        return 'utf-8'
+    raw_data.seek(0)
+    head = raw_data.read(ENCODING_SAMPLE)
+    raw_data.seek(0)
+    return detect_encoding(head) if isinstance(head, bytes) else 'utf-8'
+
+
+def chat_member(archive):
+    """
+    Picks the chat text of a zipped export among its members.
+
+    iOS names it '_chat.txt' and Android 'WhatsApp Chat with <name>.txt'; otherwise
+    the largest text file is taken, attachments being media and documents.
+
+    Parameters:
+    - archive (zipfile.ZipFile): The export
+
+    Returns:
+    - zipfile.ZipInfo: The chat member, or None if the archive holds no text file
+    """
+
+    texts = [info for info in archive.infolist() if not info.is_dir() and info.filename.lower().endswith('.txt')]
+    if not texts:
+        return None
+
+    def rank(info):
+        name = os.path.basename(info.filename)
+        return name != '_chat.txt' and not name.startswith('WhatsApp Chat'), -info.file_size
+
+    return min(texts, key=rank)
+
+
+def open_export(raw_data):
+    """
+    Opens the chat text of a zipped export as a binary stream, decompressed as it is read.
+
+    Only the central directory and the chat member of the archive are read; the
+    attachments are neither extracted nor decompressed. Anything else is returned
+    unchanged, so this can be applied to every upload.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): Raw chat data, see iter_blocks
+
+    Returns:
+    - The chat member as a seekable binary file object for a zip archive (an empty one
+      if it cannot be read), raw_data itself otherwise
+    """
+
+    if isinstance(raw_data, bytes):
+        if not raw_data.startswith(ZIP_MAGIC):
+            return raw_data
+        raw_data = io.BytesIO(raw_data)
+    elif not hasattr(raw_data, 'read') or not hasattr(raw_data, 'seek') or isinstance(raw_data, io.TextIOBase):
+        return raw_data
+    else:
+        raw_data.seek(0)
+        magic = raw_data.read(len(ZIP_MAGIC))
+        raw_data.seek(0)
+        if magic != ZIP_MAGIC:
+            return raw_data
+
+    try:
+        archive = zipfile.ZipFile(raw_data)
+        member = chat_member(archive)
+        if member is None:
+            print("Error: the zip archive holds no chat text file")
+            return io.BytesIO()
+        # Closing the archive leaves the upload open, and the member readable
+        return archive.open(member)
+    except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+        print(f"Error: could not read the zip archive: {str(e)}")
+        return io.BytesIO()
+
+
+def iter_blocks(raw_data, encoding=None, block_size=BLOCK_SIZE):
+    """
+    Lazily yields the text of a WhatsApp chat export in blocks that end on a line boundary.
+
+    A zipped export is read from its chat member (see open_export). Binary input
+    is decoded incrementally, in the encoding its byte order mark or content
+    announces unless one is given, and a byte order mark is dropped. Undecodable
+    bytes are replaced rather than failing the parse.
+
+    Parameters:
+    - raw_data (str | bytes | file-like | iterable): The export as a string, raw bytes,
+      a text or binary file object (e.g. a Streamlit upload), a zip archive of it
+      as bytes or a binary file object, or an iterable of lines
+    - encoding (str): Encoding used to decode binary input, or None to detect it
+    - block_size (int): Approximate number of characters per block
+
+    Returns:
+    - generator: Blocks of whole '\\n'-terminated lines, decoded incrementally for binary input
+    """
+
+    if isinstance(raw_data, bytes):
+        raw_data = io.BytesIO(raw_data)
+    elif isinstance(raw_data, str):
+        raw_data = io.StringIO(raw_data, newline=None)
+
+    if not hasattr(raw_data, 'read'):
+        # Already an iterable of lines (e.g. the output of str.split("\n"))
+        lines, size = [], 0
+        for line in raw_data:
+            line = line.rstrip("\r\n")
+            lines.append(line)
+            size += len(line) + 1
+            if size >= block_size:
+                yield "\n".join(lines) + "\n"
+                lines, size = [], 0
+        if lines:
+            yield "\n".join(lines) + "\n"
+        return
+
+    member = open_export(raw_data)
+    if hasattr(member, 'seek'):
+        member.seek(0)
+
+    # Decode binary input incrementally instead of materialising the whole text
+    detach = not isinstance(member, io.TextIOBase)
+    if detach and encoding is None:
+        encoding = sniff_encoding(member)
+    text = io.TextIOWrapper(member, encoding=encoding, errors=DECODE_ERRORS) if detach else member
+    try:
+        carry = ""
+        first = True
+        while True:
+            block = text.read(block_size)
+            if not block:
+                break
+            if first:
+                block = block.removeprefix("\ufeff")
+                first = False
+            block = carry + block
+            end = block.rfind("\n")
+            if end == -1:
+                carry = block
+                continue
+            carry = block[end + 1:]
+            yield block[:end + 1]
+        if carry:
+            yield carry + "\n"
+    finally:
+        if detach:
+            # Detach so that closing the wrapper does not close the caller's file
+            text.detach()
+        if member is not raw_data:
+            member.close()
+
+
+def _clean_time(value):
+    """
+    Normalises the AM/PM marker of a time string ('9:05p.m.' -> '9:05pm') for strptime.
+    """
+
+    return value.replace('.', '')
+
+
+def parse_unique(values, datetime_format, cache, clean=None):
+    """
+    Parses every distinct string of a column once and broadcasts the result back.
+
+    A chat has only a few thousand distinct dates and times, so this is much
+    cheaper than parsing every row. Parsed strings are remembered in cache, so
+    later blocks of the same export only parse strings they introduce.
+
+    Parameters:
+    - values (pd.Series): Strings to parse
+    - datetime_format (str): Explicit strptime format of the strings
+    - cache (dict): Already parsed strings, updated in place
+    - clean (callable): Optional normalisation applied to each distinct string before parsing
+
+    Returns:
+    - np.ndarray: datetime64 values aligned with the input
+    """
+
+    codes, uniques = pd.factorize(values)
+    missing = [value for value in uniques if value not in cache]
+    if missing:
+        parsed = pd.to_datetime([clean(value) for value in missing] if clean else missing, format=datetime_format)
+        cache.update(zip(missing, parsed.to_numpy()))
+    return np.array([cache[value] for value in uniques], dtype='datetime64[ns]')[codes]
+
+
+def filter_fields(fields, chat_filter):
+    """
+    Drops the raw rows of a block that a filter excludes by sender or message, before their timestamps are parsed.
+
+    Parameters:
+    - fields (pd.DataFrame): Raw 'date', 'time', 'ampm', 'Sender' and 'Message' strings
+    - chat_filter (ChatFilter): The filter
+
+    Returns:
+    - pd.DataFrame: The rows kept
+    """
+
+    keep = np.ones(len(fields), dtype=bool)
+    if chat_filter.senders is not None:
+        codes, senders = pd.factorize(fields['Sender'])
+        keep &= senders.str.strip().isin(list(chat_filter.senders))[codes]
+    if chat_filter.exclude_media:
+        keep &= ~fields['Message'].str.contains(MEDIA_MESSAGE).to_numpy(dtype=bool)
+    if chat_filter.exclude_system:
+        keep &= ~fields['Message'].str.strip().isin(SYSTEM_MESSAGES).to_numpy()
+    return fields[keep] if not keep.all() else fields
+
+
+def parse_block(block, message_regex, datetime_format, cache, chat_filter=None):
+    """
+    Parses every message of a block of text with a single regex pass.
+
+    Parameters:
+    - block (str): Text of the export, ending on a line boundary
+    - message_regex (regex.Pattern): Compiled block-level message pattern
+    - datetime_format (tuple): Explicit formats of the date and of '<time><AM/PM>'
+    - cache (dict): Parsed date and time strings shared by the blocks of one export
+    - chat_filter (ChatFilter): Messages to keep, or None for every message
+
+    Returns:
+    - pd.DataFrame: 'timestamp', 'Sender' and 'Message' columns, or None if the block has no messages
+    """
+
+    rows = message_regex.findall(block)
+    if not rows:
+        return None
+
+    fields = pd.DataFrame(rows, columns=['date', 'time', 'ampm', 'Sender', 'Message'])
+    del rows
+    if chat_filter is not None:
+        fields = filter_fields(fields, chat_filter)
+        if fields.empty:
+            return None
+
+    date_format, time_format = datetime_format
+    dates = parse_unique(fields['date'], date_format, cache)
+    times = parse_unique(fields['time'] + fields['ampm'], time_format, cache, _clean_time) - TIME_EPOCH
+    timestamp = dates + times
+
+    # Few distinct senders: strip each name once
+    codes, senders = pd.factorize(fields['Sender'])
+    chunk = pd.DataFrame({
+        'timestamp': timestamp,
+        'Sender': senders.str.strip().to_numpy()[codes],
+        'Message': fields['Message'].str.strip().to_numpy()
+    })
+
+    # Messages of the blocks that straddle the bounds of the date range
+    if chat_filter is not None and (chat_filter.start is not None or chat_filter.end is not None):
+        keep = np.ones(len(chunk), dtype=bool)
+        if chat_filter.start is not None:
+            keep &= timestamp >= pd.Timestamp(chat_filter.start).to_datetime64()
+        if chat_filter.end is not None:
+            keep &= timestamp < pd.Timestamp(chat_filter.end).to_datetime64()
+        if not keep.all():
+            chunk = chunk[keep].reset_index(drop=True)
+    return chunk if len(chunk) else None
+
+
+def last_message_start(block, timestamp_regex):
+    """
+    Finds the last line of a block that starts with a timestamp.
+
+    Parameters:
+    - block (str): Text of the export, ending on a line boundary
+    - timestamp_regex (regex.Pattern): Compiled timestamp pattern
+
+    Returns:
+    - int: Offset of that line, or -1 if no line of the block starts with a timestamp
+    """
+
+    end = len(block)
+    while end > 0:
+        start = block.rfind("\n", 0, end - 1) + 1
+        if timestamp_regex.match(block, start):
+            return start
+        end = start
+    return -1
+
+
+def block_dates(block, timestamp_regex, date_format):
+    """
+    Returns the dates of the first and last messages of a block from their timestamp prefixes.
+
+    Parameters:
+    - block (str): Text of the export, ending on a line boundary
+    - timestamp_regex (regex.Pattern): Compiled timestamp pattern
+    - date_format (str): Explicit format of the dates
+
+    Returns:
+    - tuple: (first date, last date) as pd.Timestamp, or None if no line of the block starts with a timestamp
+    """
+
+    first = timestamp_regex.search(block)
+    if first is None:
+        return None
+    last = timestamp_regex.match(block, last_message_start(block, timestamp_regex))
+    dates = pd.to_datetime([first.group(1), last.group(1)], format=date_format)
+    return dates[0], dates[1]
+
+
+def iter_chunks(blocks, dialect, chat_filter=None):
+    """
+    Parses blocks of an export into columnar DataFrame chunks.
+
+    The last message of every block is carried over to the next one, so messages
+    whose continuation lines straddle a block boundary are parsed whole.
+
+    With a date range, the dates of the first and last messages of every block are
+    read from their timestamp prefixes before the block is parsed: exports are in
+    chronological order, so blocks ending before the range are skipped without
+    extracting their messages and reading stops at the first block after it.
+
+    Parameters:
+    - blocks (iterable): Blocks of text as produced by iter_blocks
+    - dialect (Dialect): Format of the export, see detect_format
+    - chat_filter (ChatFilter): Messages to keep, or None for every message
+
+    Returns:
+    - generator: DataFrames with 'timestamp', 'Sender' and 'Message' columns
+    """
+
+    message_regex, timestamp_regex = compile_patterns(dialect)
+    datetime_format = datetime_formats(dialect)
+    first_day = last_day = None
+    if chat_filter is not None:
+        if chat_filter.start is not None:
+            first_day = pd.Timestamp(chat_filter.start).normalize()
+        if chat_filter.end is not None:
+            last_day = pd.Timestamp(chat_filter.end)
+    cache = {}
+    seen = False
+    carry = ""
+    for block in blocks:
+        block = carry + block
+        start = last_message_start(block, timestamp_regex)
+        if start == -1:
+            # Either the middle of a very long message, or text before the first message
+            carry = block if seen else ""
+            continue
+
+        seen = True
+        carry = block[start:]
+        if first_day is not None or last_day is not None:
+            dates = block_dates(block[:start], timestamp_regex, datetime_format[0])
+            if dates is not None:
+                if last_day is not None and dates[0] >= last_day:
+                    # This block and every later one are after the range
+                    return
+                if first_day is not None and dates[1] < first_day:
+                    continue
+        chunk = parse_block(block[:start], message_regex, datetime_format, cache, chat_filter)
+        if chunk is not None:
+            yield chunk
+
+    if carry:
+        chunk = parse_block(carry, message_regex, datetime_format, cache, chat_filter)
+        if chunk is not None:
+            yield chunk
+
+
+def label_category(labels, positions):
+    """
+    Builds a categorical of labels[positions] from integer codes, without creating a string per row.
+
+    The categories are every label in alphabetical order, so the categorical sorts
+    and groups like the plain strings would.
+
+    Parameters:
+    - labels (np.ndarray): Label of every position
+    - positions (np.ndarray): Position of every row
+
+    Returns:
+    - pd.Categorical: The labels of the rows
+    """
+
+    categories = np.unique(labels)
+    codes = np.searchsorted(categories, labels)
+    return pd.Categorical.from_codes(codes[positions], categories)
+
+
+def compact_schema(df):
+    """
+    Converts a preprocessed DataFrame to the compact schema (see CATEGORY_COLUMNS).
+
+    Columns already in their compact dtype are left as they are, so this is cheap
+    on DataFrames that are already compact, e.g. read back from the cache.
+
+    Parameters:
+    - df (pd.DataFrame): Output of preprocess
+
+    Returns:
+    - pd.DataFrame: The DataFrame in the compact schema
+    """
+
+    df = df.drop(columns=[name for name in DERIVED_COLUMNS if name in df])
+    for name in CATEGORY_COLUMNS:
+        if not isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].astype('category')
+    for name, dtype in CALENDAR_DTYPES.items():
+        df[name] = df[name].astype(dtype)
+    if df['Message'].dtype != MESSAGE_DTYPE:
+        df['Message'] = df['Message'].astype(MESSAGE_DTYPE)
+    return df
+
+
+def column(df, name):
+    """
+    Returns a column of a preprocessed DataFrame, deriving it from 'timestamp' if the compact schema left it out.
+
+    Parameters:
+    - df (pd.DataFrame): Output of preprocess, in either schema
+    - name (str): Column name
+
+    Returns:
+    - pd.Series: The column
+    """
+
+    if name in df:
+        return df[name]
+    return DERIVED_COLUMNS[name](df['timestamp']).rename(name)
+
+
+@instrumented
+def preprocess(raw_data, device=None, dialect=None, compact=False, chat_filter=None, encoding=None):
     """
     Preprocesses raw WhatsApp chat data to extract structured information.
 
+    The export is streamed in blocks, every block is parsed with one multiline
+    regex pass and a single explicit-format datetime conversion, and the chunks
+    are concatenated once. Calendar features are derived from the resulting
+    'timestamp' column with the .dt accessors.
+
+    The format of the export (device, date order, year digits, 12/24-hour clock)
+    is detected from its first lines, so exactly one specialised pattern and one
+    pair of datetime formats are used for the full parse.
+
     Parameters:
-    - raw_data (str): Raw chat data as a single string
-    - device (str): Device type ('ios' or 'android')
+    - raw_data (str | bytes | file-like | iterable): Raw chat data, see iter_blocks
+    - device (str): Device type ('ios' or 'android'), or None to detect it
+    - dialect (Dialect): Format of the export, if already known; used as is for data
+      too short to detect it from, such as the new messages of an updated export
+    - compact (bool): Produce the compact schema (see CATEGORY_COLUMNS) instead of
+      'Date'/'Time' columns and plain strings and integers
+    - chat_filter (ChatFilter): Messages to keep, applied while parsing so that the
+      messages left out are never stored; None keeps every message
+    - encoding (str): Encoding of binary input, or None to detect it, see iter_blocks
 
     Returns:
     - pd.DataFrame: Processed DataFrame with date/time features
     """
-    
-    # iOS pattern (with brackets)
-    ios_pattern = r'''
-        \s*‎?\[?                           # Optional whitespace and invisible character and opening bracket
-        (\d{1,2}/\d{1,2}/\d{2}),\s*       # Date in DD/MM/YY format
-        (\d{1,2}:\d{1,2}:\d{1,2})\s*      # Time in HH:MM:SS format
-        ([APMapm]{2})\]?\s*               # AM/PM
-        (.+?):\s*                         # Sender name
-        (.+)                              # Message content
-    '''
-    
-    # Android pattern (without brackets)
-    android_pattern = r'''
-        (\d{1,2}/\d{1,2}/\d{2,4}),\s*    # Date
-        (\d{1,2}:\d{2})\s*([AaPpMm]{2})\s*   # Time and AM/PM
-        -\s*
-        ([^:]+):\s*                       # Sender name
-        (.+)                              # Message content
-    '''
-    
-    # Select pattern based on device
-    pattern = ios_pattern if device.lower() == "ios" else android_pattern
-    
-    # Initialize lists
-    dates, times, senders, messages = [], [], [], []
-    no_match = 0
-    
-    # Compile the pattern
-    regex = re.compile(pattern, re.VERBOSE)
-    
-    # Process each entry
-    for entry in raw_data:
-        entry = entry.strip()
-        if not entry:  # Skip empty lines
-            continue
-            
-        match = regex.match(entry)
-        
-        if match:
-            date, time, ampm, sender, message = match.groups()
-            dates.append(date)
-            times.append(f"{time} {ampm}")
-            senders.append(sender.strip())
-            messages.append(message.strip())
-        else:
-            no_match += 1
-            dates.append(None)
-            times.append(None)
-            senders.append("Unknown")
-            messages.append(entry.strip())
-    
-    # Create initial DataFrame
-    df = pd.DataFrame({
-        'Date': dates,
-        'Time': times,
-        'Sender': senders,
-        'Message': messages
-    })
-    
-    # Clean data: Remove rows with None values
-    df = df.dropna()
-    
+
+    blocks = iter_blocks(raw_data, encoding)
+    first = next(blocks, "")
+    if dialect is None:
+        dialect = detect_format(first, device.lower() if device else None)
+    if dialect is None:
+        print("Error: could not detect the format of the chat export")
+        return None
+
     try:
-        # Convert Date to datetime
-        df['Date'] = pd.to_datetime(df['Date'])
-        
-        # Convert Time based on device format
-        if device.lower() == "ios":
-            # For iOS format (HH:MM:SS AM/PM)
-            df['Time'] = pd.to_datetime(df['Time'], format='%H:%M:%S %p').dt.time
+        # Stream the export into columnar chunks and concatenate them once
+        chunks = list(iter_chunks(itertools.chain([first], blocks), dialect, chat_filter))
+        del first
+        if chunks:
+            df = pd.concat(chunks, ignore_index=True)
         else:
-            # For Android format (HH:MM AM/PM)
-            df['Time'] = pd.to_datetime(df['Time'], format='%H:%M %p').dt.time
-        
+            df = pd.DataFrame({'timestamp': pd.Series(dtype='datetime64[ns]'),
+                               'Sender': pd.Series(dtype=object),
+                               'Message': pd.Series(dtype=object)})
+        del chunks
+
+        timestamp = df['timestamp'].dt
+
+        if compact:
+            # Labels as categorical codes, calendar fields as small integers
+            df['Sender'] = df['Sender'].astype('category')
+            df['Message'] = df['Message'].astype(MESSAGE_DTYPE)
+            df['month'] = label_category(MONTH_LABELS, timestamp.month.to_numpy() - 1)
+            df['day'] = timestamp.day.astype(CALENDAR_DTYPES['day'])
+            df['day_name'] = label_category(DAY_LABELS, timestamp.dayofweek.to_numpy())
+            df['year'] = timestamp.year.astype(CALENDAR_DTYPES['year'])
+            df['hour_with_ampm'] = label_category(HOUR_LABELS, timestamp.hour.to_numpy())
+            df['minute'] = timestamp.minute.astype(CALENDAR_DTYPES['minute'])
+            return df
+
+        # Date and time components
+        df.insert(0, 'Date', timestamp.normalize())
+        df.insert(1, 'Time', timestamp.time)
+
         # Extract additional time/date components
-        df['month'] = df['Date'].dt.month_name()
-        df['day'] = df['Date'].dt.day
-        df['day_name'] = df['Date'].dt.day_name()
-        df['year'] = df['Date'].dt.year
-        
-        # Convert Time to string and then back to datetime for consistent formatting
-        df['hour_with_ampm'] = pd.to_datetime(df['Time'].astype(str)).dt.strftime('%I %p')
-        df['minute'] = pd.to_datetime(df['Time'].astype(str)).dt.minute
-        
+        df['month'] = timestamp.month_name()
+        df['day'] = timestamp.day
+        df['day_name'] = timestamp.day_name()
+        df['year'] = timestamp.year
+
+        # '%I %p' labels looked up by hour instead of formatting every row
+        df['hour_with_ampm'] = HOUR_LABELS[timestamp.hour.to_numpy()]
+        df['minute'] = timestamp.minute
+
     except Exception as e:
         print(f"Error during datetime processing: {str(e)}")
-        # Print a sample of the time data for debugging
-        print("Sample time values:", df['Time'].head())
         return None
-    
+
     return df
@@ -0,0 +1,311 @@
+"""
+Full-text search of a chat's messages.
+
+SearchIndex is built once per chat from the output of preprocess, with the
+tokenizer and stop words of the word cloud, and stored next to the parsed chat
+(see cache.cached_search_index). Queries are answered from its integer posting
+lists in milliseconds, with the sender and date filters of the analyses.
+"""
+
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+from stop_words import STOP_WORDS
+from tokens import TOKENIZE_BATCH, normalize
+
+# Token placed between the messages of a batch before it is split, marking message boundaries;
+# a control character, which split() keeps as a word and messages practically never hold
+SEPARATOR = "\x01"
+
+
+def tokenize(messages):
+    """
+    Splits messages into words with the word-cloud tokenizer, keeping where every word occurs.
+
+    Messages are joined per batch with a separator token and split once; the
+    separators give the message of every word. Words are numbered per batch
+    and the batch vocabularies merged, so no array of word strings is held for
+    the whole chat.
+
+    Parameters:
+    - messages (pd.Series): Chat messages
+
+    Returns:
+    - tuple: (list of the distinct words, int32 word ids, int32 message rows, word positions
+      within their message), the last three with one entry per word of the chat
+    """
+
+    vocabulary = {}
+    ids, rows, positions = [], [], []
+    for start in range(0, len(messages), TOKENIZE_BATCH):
+        batch = messages.iloc[start:start + TOKENIZE_BATCH].tolist()
+        words = np.array(normalize(f" {SEPARATOR} ".join(batch)).split(), dtype=object)
+        boundary = words == SEPARATOR
+        if boundary.sum() != len(batch) - 1:
+            # A message holds the separator itself: split it message by message instead
+            split = [normalize(message).split() for message in batch]
+            words = np.array([word for message in split for word in message], dtype=object)
+            row = np.repeat(np.arange(len(batch)), [len(message) for message in split])
+        else:
+            row = np.cumsum(boundary)[~boundary]
+            words = words[~boundary]
+
+        # Position of every word within its message
+        counts = np.bincount(row, minlength=len(batch))
+        position = np.arange(len(words)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        codes, uniques = pd.factorize(words)
+        batch_ids = np.array([vocabulary.setdefault(word, len(vocabulary)) for word in uniques], dtype=np.int32)
+        ids.append(batch_ids[codes])
+        rows.append((row + start).astype(np.int32))
+        positions.append(position)
+
+    if not ids:
+        return [], np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.int32)
+    return list(vocabulary), np.concatenate(ids), np.concatenate(rows), np.concatenate(positions)
+
+
+def parse_query(query):
+    """
+    Splits a search query into its words, with the tokenizer of the index.
+
+    Parameters:
+    - query (str): Words, or a phrase between double quotes
+
+    Returns:
+    - tuple: (list of words, whether they form a phrase)
+    """
+
+    query = query.strip()
+    phrase = len(query) > 1 and query.startswith('"') and query.endswith('"')
+    return normalize(query.strip('"')).split(), phrase
+
+
+def unindexed_words(query):
+    """
+    Returns the words of a query that are not indexed, being stop words.
+
+    Parameters:
+    - query (str): Words, or a phrase between double quotes
+
+    Returns:
+    - list: The stop words of the query, in query order
+    """
+
+    return [word for word in parse_query(query)[0] if word in STOP_WORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index of the words of a preprocessed chat.
+
+    Words are tokenized like generate_wc counts them (see tokens.py) and stop
+    words are left out. The postings of every word, the rows of the messages
+    holding it and its positions in them, are slices of two integer arrays
+    sorted by word, so a lookup is a binary search plus a slice. Positions count
+    every word, stop words included, so the words of a phrase must keep their
+    distances; a stop word in a phrase matches any word at its place, as in
+    search engines that drop stop words.
+
+    Like ChatIndex, the index keeps a reference to its DataFrame, is picklable
+    without it, and accepts the sender and date filters of the analyses.
+    """
+
+    def __init__(self, df):
+        """
+        Parameters:
+        - df (pd.DataFrame): Output of preprocess
+        """
+
+        self.df = df
+        self.attrs = dict(df.attrs)
+        words, ids, rows, positions = tokenize(df['Message'])
+        position_type = np.int16 if len(positions) == 0 or positions.max() < 2**15 - 1 else np.int32
+        # Number of words of every message, stop words included, so phrases stay within their message
+        self.lengths = np.bincount(rows, minlength=len(df)).astype(position_type)
+
+        # Stop words are not indexed
+        words = np.array(words, dtype=object)
+        indexed = ~pd.Index(words).isin(list(STOP_WORDS)) if len(words) else np.empty(0, dtype=bool)
+        keep = indexed[ids]
+        ids, rows, positions = ids[keep], rows[keep], positions[keep]
+
+        # Postings of words[i]: rows/positions[offsets[i]:offsets[i + 1]], words sorted for lookups
+        order = np.argsort(words[indexed]) if len(words) else np.empty(0, dtype=np.intp)
+        new_ids = np.empty(len(words), dtype=np.int32)
+        new_ids[np.flatnonzero(indexed)[order]] = np.arange(len(order), dtype=np.int32)
+        ids = new_ids[ids]
+        sort = np.argsort(ids, kind='stable')
+        self.words = words[indexed][order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(self.words)))])
+        self.rows = rows[sort]
+        self.positions = positions[sort].astype(position_type)
+
+        # Sender and time of every message, for the filters
+        sender = df['Sender'].astype('category')
+        self.senders = sender.cat.categories
+        self.sender_codes = sender.cat.codes.to_numpy()
+        self.timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+
+    def __getstate__(self):
+        # The DataFrame is stored separately (see cache.py) and attached again after loading
+        state = self.__dict__.copy()
+        state['df'] = None
+        return state
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the index itself, excluding the DataFrame it refers to.
+        """
+
+        return int(self.words.nbytes + sum(len(word) + 49 for word in self.words) + self.offsets.nbytes
+                   + self.lengths.nbytes + self.rows.nbytes + self.positions.nbytes + self.sender_codes.nbytes + self.timestamps.nbytes)
+
+    def postings(self, word):
+        """
+        Returns the rows and positions of a word, in chat order.
+
+        Parameters:
+        - word (str): A normalized word
+
+        Returns:
+        - tuple: (rows, positions) arrays, empty if the word is not indexed
+        """
+
+        i = np.searchsorted(self.words, word)
+        if i == len(self.words) or self.words[i] != word:
+            return self.rows[:0], self.positions[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]], self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def occurrences(self, query):
+        """
+        Returns the row of every occurrence of a query.
+
+        A single word or a phrase counts every time it occurs; several words count
+        once per message holding all of them. Stop words of a phrase only keep
+        their place, since they are not indexed, and a query of stop words only
+        matches nothing.
+
+        Parameters:
+        - query (str): Words, or a phrase between double quotes
+
+        Returns:
+        - np.ndarray: Rows in chat order, repeated for repeated occurrences
+        """
+
+        words, phrase = parse_query(query)
+        terms = [(offset, word) for offset, word in enumerate(words) if word not in STOP_WORDS]
+        # Every term must occur, so a term without postings (or an empty index) matches nothing
+        if not terms or any(len(self.postings(word)[0]) == 0 for _, word in terms):
+            return self.rows[:0]
+
+        if phrase and len(words) > 1:
+            # Occurrences as (row, position of the phrase's first word) keys, intersected word by word
+            width = int(self.positions.max()) + len(words) + 1
+            matches = None
+            for offset, word in terms:
+                rows, positions = self.postings(word)
+                keys = rows.astype(np.int64) * width + (positions.astype(np.int64) - offset + len(words))
+                matches = keys if matches is None else np.intersect1d(matches, keys, assume_unique=True)
+            rows = (matches // width).astype(self.rows.dtype)
+            first = matches % width - len(words)
+            # The stop words at either end of the phrase must fall within the message
+            return rows[(first >= 0) & (first + len(words) <= self.lengths[rows])]
+
+        if len(terms) == 1:
+            return self.postings(terms[0][1])[0]
+
+        matches = None
+        for _, word in terms:
+            rows = np.unique(self.postings(word)[0])
+            matches = rows if matches is None else np.intersect1d(matches, rows, assume_unique=True)
+        return matches
+
+    def filter_rows(self, rows, senders=None, start=None, end=None):
+        """
+        Keeps the rows of some senders within a date range.
+
+        Parameters:
+        - rows (np.ndarray): Message rows
+        - senders (list): Sender names to keep, or None for every sender
+        - start: First time kept (inclusive), anything pd.Timestamp accepts, or None
+        - end: Time after the last one kept (exclusive), or None
+
+        Returns:
+        - np.ndarray: The rows kept
+        """
+
+        keep = np.ones(len(rows), dtype=bool)
+        if senders is not None and not isinstance(senders, str):
+            codes = self.senders.get_indexer(list(senders))
+            keep &= np.isin(self.sender_codes[rows], codes[codes >= 0])
+        elif senders is not None and senders != "Whole Group":
+            keep &= self.sender_codes[rows] == self.senders.get_indexer([senders])[0]
+        if start is not None:
+            keep &= self.timestamps[rows] >= pd.Timestamp(start).to_datetime64()
+        if end is not None:
+            keep &= self.timestamps[rows] < pd.Timestamp(end).to_datetime64()
+        return rows[keep]
+
+    @instrumented
+    def search(self, query, senders=None, start=None, end=None):
+        """
+        Finds the messages matching a query.
+
+        Parameters:
+        - query (str): Words, or a phrase between double quotes
+        - senders (str | list): Sender name(s) to keep, 'Whole Group' or None for every sender
+        - start: First time kept (inclusive), or None
+        - end: Time after the last one kept (exclusive), or None
+
+        Returns:
+        - np.ndarray: Rows of the matching messages, in chat order
+        """
+
+        return np.unique(self.filter_rows(self.occurrences(query), senders, start, end))
+
+    def count(self, query, senders=None, start=None, end=None):
+        """
+        Counts the occurrences of a query and the messages holding it ("how often did X say Y").
+
+        Returns:
+        - tuple: (occurrences, messages)
+        """
+
+        rows = self.filter_rows(self.occurrences(query), senders, start, end)
+        return len(rows), len(np.unique(rows))
+
+    def counts_over_time(self, query, freq='MS', senders=None, start=None, end=None):
+        """
+        Counts the occurrences of a query per period.
+
+        Parameters:
+        - query (str): Words, or a phrase between double quotes
+        - freq (str): pandas resample rule of the periods, e.g. 'D', 'W-MON' or 'MS'
+        - senders (str | list): Sender filter, see search
+        - start: First time kept (inclusive), or None
+        - end: Time after the last one kept (exclusive), or None
+
+        Returns:
+        - pd.Series: Occurrences indexed by the start of every period
+        """
+
+        rows = self.filter_rows(self.occurrences(query), senders, start, end)
+        times = pd.DatetimeIndex(self.timestamps[rows])
+        return pd.Series(1, index=times, dtype='int64').resample(freq).sum()
+
+    def messages(self, rows, limit=None):
+        """
+        Returns the time, sender and text of messages.
+
+        Parameters:
+        - rows (np.ndarray): Message rows, see search
+        - limit (int): Largest number of messages returned, or None for all
+
+        Returns:
+        - pd.DataFrame: 'timestamp', 'Sender' and 'Message' columns
+        """
+
+        rows = rows[:limit] if limit is not None else rows
+        return self.df[['timestamp', 'Sender', 'Message']].take(rows).reset_index(drop=True)
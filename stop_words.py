@@ -1,25 +1,64 @@
-# Open the file in read mode first to get existing stop words
-with open(".\\stop_hinglish.txt", 'r') as f:
-    stop_words = f.read().splitlines()
-
-# Add new stop words to the list
-new_stop_words = [
-    "<media",
-    "omitted>",
-    "<media ",
-    "to",
-    "or",
-    "hai",
-    "omitted",
-    "media",
-    " ",
-    "<media omitted>"
-]
-
-# Append new stop words to the existing list
-stop_words.extend(new_stop_words)
-
-# Write the updated list back to the file
-with open(".\\stop_hinglish.txt", 'a') as f:
-    for word in stop_words:
-        f.write(word + '\n')  # Write each stop word on a new line
+import hashlib
+import os
+
+# Directory of this module, so the word lists are found from any working directory
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Hinglish and English stop words, one per line
+HINGLISH_FILE = os.path.join(current_dir, 'stop_hinglish.txt')
+
+# Tokens the "<Media omitted>" placeholder of the exports leaves behind once lowercased and split
+MEDIA_TOKENS = ["<media", "omitted>", "<media omitted>", "media", "omitted"]
+
+# Common words missing from the Hinglish list
+EXTRA_WORDS = ["to", "or", "hai"]
+
+# Extra stop-word files supplied by the user, separated by os.pathsep
+EXTRA_FILES = [path for path in os.environ.get("WHATSAPP_WRAP_STOP_WORDS", "").split(os.pathsep) if path]
+
+
+def read_words(path):
+    """
+    Reads a stop-word file, one word per line.
+
+    Parameters:
+    - path (str): Path of the file
+
+    Returns:
+    - list: The words, or an empty list if the file does not exist
+    """
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        print(f"Error: The file '{path}' was not found.")
+        return []
+
+
+def load_stop_words(extra_words=(), extra_files=()):
+    """
+    Builds the stop-word set from the Hinglish list, the media tokens and any extras.
+
+    Words are stripped and lowercased, the way messages are tokenized before
+    the lookup, and deduplicated. The word lists are only read, never written.
+
+    Parameters:
+    - extra_words (iterable): Additional stop words
+    - extra_files (iterable): Additional stop-word files, one word per line
+
+    Returns:
+    - tuple: (frozenset of stop words, version string identifying the set)
+    """
+
+    words = read_words(HINGLISH_FILE) + MEDIA_TOKENS + EXTRA_WORDS + list(extra_words)
+    for path in extra_files:
+        words += read_words(path)
+
+    stop_words = frozenset(word.strip().lower() for word in words if word.strip())
+    version = hashlib.blake2b("\n".join(sorted(stop_words)).encode("utf-8"), digest_size=8).hexdigest()
+    return stop_words, version
+
+
+# Loaded once per process
+STOP_WORDS, STOP_WORDS_VERSION = load_stop_words(extra_files=EXTRA_FILES)
@@ -0,0 +1,171 @@
+"""
+Adaptive resolution of the timeline charts.
+
+A timeline longer than the point budget is either rolled up to the finest of
+week/month/quarter/year buckets that fits, or reduced with Largest-Triangle-
+Three-Buckets (LTTB), which keeps the points that shape the line, peaks
+included. Timelines are returned as NumPy arrays (datetime64 and int64), so
+the figure sent to the browser stays bounded however long the chat is.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import analyser
+from instrumentation import instrumented
+from preprocessor import MONTH_LABELS
+
+# Largest number of points sent to a timeline chart
+POINT_BUDGET = 500
+
+# Buckets a timeline is rolled up to, finest first: name -> resample rule (labelled by the bucket start)
+ROLLUPS = {'week': 'W-MON', 'month': 'MS', 'quarter': 'QS', 'year': 'YS'}
+
+# Points of a chart: dates, message counts, the name of one bucket ('day', 'week', ..., or
+# 'sampled day' after LTTB) and the number of points before downsampling
+Timeline = namedtuple('Timeline', ['x', 'y', 'resolution', 'points'])
+
+
+def roll_up(x, y, rule):
+    """
+    Sums counts into coarser time buckets.
+
+    Parameters:
+    - x (np.ndarray): datetime64 dates, sorted
+    - y (np.ndarray): Counts
+    - rule (str): pandas resample rule, see ROLLUPS
+
+    Returns:
+    - tuple: (bucket start dates, summed counts), empty buckets included as 0
+    """
+
+    closed = 'left' if rule.startswith('W') else None
+    counts = pd.Series(y, index=pd.DatetimeIndex(x)).resample(rule, label='left', closed=closed).sum()
+    return counts.index.to_numpy(), counts.to_numpy(dtype=np.int64)
+
+
+def lttb(x, y, n_out):
+    """
+    Picks n_out points of a line with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between keeps the point
+    forming the largest triangle with the point kept before it and the mean of
+    the next bucket, so spikes and dips survive the reduction.
+
+    Parameters:
+    - x (np.ndarray): datetime64 dates, sorted
+    - y (np.ndarray): Values
+    - n_out (int): Number of points kept, at least 3
+
+    Returns:
+    - tuple: (dates, values) of the kept points
+    """
+
+    n = len(x)
+    if n <= n_out:
+        return x, y
+
+    xs = x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    ys = y.astype(np.float64)
+    # Bucket boundaries of the points between the first and the last one
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    means_x = np.add.reduceat(xs[1:-1], edges[:-1] - 1) / np.diff(edges)
+    means_y = np.add.reduceat(ys[1:-1], edges[:-1] - 1) / np.diff(edges)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    # One step per bucket (at most the point budget), each a vectorized argmax over its points
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x = means_x[bucket + 1] if bucket + 1 < n_out - 2 else xs[-1]
+        next_y = means_y[bucket + 1] if bucket + 1 < n_out - 2 else ys[-1]
+        area = np.abs((xs[previous] - next_x) * (ys[start:end] - ys[previous])
+                      - (xs[previous] - xs[start:end]) * (next_y - ys[previous]))
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return x[kept], y[kept]
+
+
+def adapt(x, y, resolution, budget=POINT_BUDGET, method='rollup'):
+    """
+    Reduces a timeline to at most budget points.
+
+    Parameters:
+    - x (np.ndarray): datetime64 dates, sorted
+    - y (np.ndarray): Message counts
+    - resolution (str): Name of one point of the timeline, e.g. 'day'
+    - budget (int): Largest number of points returned
+    - method (str): 'rollup' to sum into coarser buckets, keeping the totals, or
+      'lttb' to keep the most significant points of the original resolution
+
+    Returns:
+    - Timeline: The reduced timeline
+    """
+
+    points = len(x)
+    if points > budget and method == 'rollup':
+        names = list(ROLLUPS)
+        # Only buckets coarser than the timeline's own resolution
+        for name in names[names.index(resolution) + 1:] if resolution in names else names:
+            rolled_x, rolled_y = roll_up(x, y, ROLLUPS[name])
+            if len(rolled_x) <= budget:
+                return Timeline(rolled_x, rolled_y, name, points)
+            x, y, resolution = rolled_x, rolled_y, name
+    if len(x) > budget:
+        x, y = lttb(x, y, max(budget, 3))
+        resolution = 'sampled ' + resolution
+    return Timeline(x, np.asarray(y, dtype=np.int64), resolution, points)
+
+
+@instrumented
+def daily_points(df, selected_user, budget=POINT_BUDGET, method='rollup'):
+    """
+    Returns the daily timeline of a sender, reduced to the point budget.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): Processed DataFrame or its index
+    - selected_user (str): Sender name, or 'Whole Group'
+    - budget (int): Largest number of points, see adapt
+    - method (str): 'rollup' or 'lttb', see adapt
+
+    Returns:
+    - Timeline: Dates and message counts
+    """
+
+    timeline = analyser.daily_timeline(selected_user, df)
+    x = timeline['Date'].to_numpy(dtype='datetime64[ns]')
+    return adapt(x, timeline['Message'].to_numpy(dtype=np.int64), 'day', budget, method)
+
+
+@instrumented
+def monthly_points(df, selected_user, budget=POINT_BUDGET, method='rollup'):
+    """
+    Returns the monthly timeline of a sender as dates and counts, reduced to the point budget.
+
+    Parameters:
+    - df (pd.DataFrame | ChatIndex): Processed DataFrame or its index
+    - selected_user (str): Sender name, or 'Whole Group'
+    - budget (int): Largest number of points, see adapt
+    - method (str): 'rollup' or 'lttb', see adapt
+
+    Returns:
+    - Timeline: First day of every month and its message count
+    """
+
+    timeline = analyser.monthly_timeline(selected_user, df)
+    months = pd.Index(MONTH_LABELS).get_indexer(timeline['month'].astype(str)) + 1
+    x = pd.to_datetime(pd.DataFrame({'year': timeline['year'].astype(np.int64), 'month': months, 'day': 1}))
+    order = np.argsort(x.to_numpy(), kind='stable')
+    x = x.to_numpy(dtype='datetime64[ns]')[order]
+    return adapt(x, timeline['Message'].to_numpy(dtype=np.int64)[order], 'month', budget, method)
+
+
+def payload_bytes(fig):
+    """
+    Returns the size of the JSON a Plotly figure is sent to the browser as.
+    """
+
+    return len(fig.to_json().encode("utf-8"))
@@ -0,0 +1,165 @@
+from collections import Counter
+import emoji
+import pandas as pd
+import re
+import regex
+from links import URL_TOKEN, token_link
+from stop_words import STOP_WORDS
+
+
+# Characters removed from words before counting them
+PUNCTUATIONS = [',', '.', '?']
+
+# Number of messages tokenized per batch, bounds the size of the joined text
+TOKENIZE_BATCH = 100_000
+
+# Words of the word cloud, the pattern WordCloud.generate tokenized with; Unicode-aware
+# (regex's \w includes combining marks), so Devanagari words stay whole
+WORD = regex.compile(r"\w[\w']+")
+
+# Version of the word tokenization, part of the keys of cached word counts and word clouds
+TOKENIZER_VERSION = 2
+
+# Code points that can start an emoji sequence, and those that occur anywhere in one
+EMOJI_STARTS = frozenset(e[0] for e in emoji.EMOJI_DATA)
+EMOJI_CHARACTERS = frozenset(''.join(emoji.EMOJI_DATA))
+
+# Length in code points of the longest emoji sequence
+MAX_EMOJI_LENGTH = max(len(e) for e in emoji.EMOJI_DATA)
+
+# Largest gap between non-ASCII code points merged into one range of a character class.
+# A regex tests a character against every range in turn, so a few wide ranges match much
+# faster than the exact set; the few other characters they let in are skipped by the loop
+CLASS_GAP = 64
+
+
+def character_class(characters, gap=CLASS_GAP):
+    """
+    Writes a set of characters as a regex character class of code point ranges.
+
+    Parameters:
+    - characters (iterable): Single characters
+    - gap (int): Largest gap between non-ASCII code points of one range; ASCII stays exact
+
+    Returns:
+    - str: The class, e.g. '[\\U00000023\\U0000002a-\\U0000002b]'
+    """
+
+    ranges = []
+    for point in sorted(map(ord, characters)):
+        if ranges and point <= ranges[-1][1] + (gap if point >= 0x80 and ranges[-1][1] >= 0x80 else 1):
+            ranges[-1][1] = point
+        else:
+            ranges.append([point, point])
+    return '[' + ''.join(f'\\U{low:08x}' + (f'-\\U{high:08x}' if high > low else '') for low, high in ranges) + ']'
+
+
+# Runs of characters that can hold an emoji: a character starting an emoji sequence (the
+# base of a keycap sequence, #, * or a digit, included) followed by non-ASCII emoji characters.
+# The first character is tested against a plain class so that ASCII text is skipped as quickly
+# as before, and only then against the emoji starts; other scripts, such as Devanagari, never
+# reach the matching loop
+EMOJI_CANDIDATES = re.compile(r'[#*0-9\u0080-\U0010ffff](?<=' + character_class(EMOJI_STARTS) + ')'
+                              + character_class(c for c in EMOJI_CHARACTERS if ord(c) >= 0x80) + '*')
+
+
+def normalize(text):
+    """
+    Lowercases text and removes PUNCTUATIONS, the way words are counted and indexed.
+    """
+
+    text = text.lower()
+    #removing "." "," "?" in words
+    for p in PUNCTUATIONS:
+        text = text.replace(p, '')
+    return text
+
+
+def ranked(counts):
+    """
+    Sorts counts most frequent first, ties in key order, so that merged and rebuilt tables agree.
+
+    Parameters:
+    - counts (pd.Series): Counts indexed by key
+
+    Returns:
+    - pd.Series: The sorted counts
+    """
+
+    return counts.sort_index().sort_values(ascending=False, kind='stable')
+
+
+def word_frequencies(messages):
+    """
+    Tokenizes messages and counts their words, without stop words.
+
+    Messages are processed in batches: each batch is joined into one string,
+    lowercased and split once, so the work happens in C string operations
+    rather than per message. Every distinct token is then reduced to its words
+    (see WORD): links are dropped, PUNCTUATIONS removed, and emoji and other
+    punctuation split off, so "ok!" counts as "ok" and "😂" not at all.
+
+    Parameters:
+    - messages (pd.Series): Chat messages
+
+    Returns:
+    - pd.Series: Word counts indexed by word, most frequent first, ties in word order (see ranked)
+    """
+
+    counts = Counter()
+    for start in range(0, len(messages), TOKENIZE_BATCH):
+        text = " ".join(messages.iloc[start:start + TOKENIZE_BATCH].tolist()).lower()
+        counts.update(text.split())
+
+    #reducing tokens to words, once per distinct token; links are recognised before "." is removed
+    words, hosts = Counter(), {}
+    for token, count in counts.items():
+        if WORD.fullmatch(token):
+            words[token] += count
+        elif not (URL_TOKEN.fullmatch(token) and token_link(token, hosts)):
+            for word in WORD.findall(normalize(token)):
+                words[word] += count
+    counts = words
+
+    #removing stopwords, once per distinct word
+    for word in STOP_WORDS.intersection(counts):
+        del counts[word]
+
+    return ranked(pd.Series(counts, dtype='int64'))
+
+
+def extract_emojis(messages):
+    """
+    Extracts every emoji of a set of messages, keeping multi-codepoint emoji
+    (ZWJ sequences, skin tones, flags, keycaps) whole.
+
+    The messages are scanned once with a precompiled pattern for runs of characters
+    that can belong to an emoji; only those runs are matched against emoji.EMOJI_DATA,
+    longest sequence first, from the characters that can start one.
+
+    Parameters:
+    - messages (pd.Series | iterable): Chat messages
+
+    Returns:
+    - list: The emojis in order of appearance
+    """
+
+    emoji_data = emoji.EMOJI_DATA
+    found = []
+    # Arrow-backed string columns convert to Python strings much faster in bulk
+    if isinstance(messages, pd.Series):
+        messages = messages.tolist()
+    for run in EMOJI_CANDIDATES.findall("\n".join(messages)):
+        start, end = 0, len(run)
+        while start < end:
+            if run[start] not in EMOJI_STARTS:
+                start += 1
+                continue
+            for length in range(min(MAX_EMOJI_LENGTH, end - start), 0, -1):
+                if run[start:start + length] in emoji_data:
+                    found.append(run[start:start + length])
+                    start += length
+                    break
+            else:
+                start += 1
+    return found